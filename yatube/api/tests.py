@@ -0,0 +1,131 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.cache import known
+from core.queries import QueryBudgetTestMixin
+from core.utils import POSTS_QUANTITY
+from posts import caching
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedApiTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(POSTS_QUANTITY + 3):
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {number}'
+            )
+        self.post = Post.objects.order_by('pub_date', 'id').first()
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds_return_posts_page(self):
+        urls = (
+            reverse('api:index'),
+            reverse('api:group_posts', args=[self.group.slug]),
+            reverse('api:profile', args=[self.author.username]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertWithinQueryBudget(response)
+                data = response.json()
+                self.assertEqual(data['count'], POSTS_QUANTITY + 3)
+                self.assertEqual(len(data['results']), POSTS_QUANTITY)
+                self.assertIsNone(data['previous'])
+                self.assertEqual(data['results'][0], {
+                    'id': self.post.pk,
+                    'text': self.post.text,
+                    'pub_date': data['results'][0]['pub_date'],
+                    'author': self.author.username,
+                    'group': self.group.slug,
+                    'image': None,
+                })
+
+    def test_next_link_continues_feed(self):
+        data = self.client.get(reverse('api:index')).json()
+        second = self.client.get(data['next']).json()
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+        ids = [post['id'] for post in data['results'] + second['results']]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('pub_date', 'id')
+                      .values_list('id', flat=True))
+        )
+
+    def test_post_detail_includes_comments(self):
+        response = self.client.get(
+            reverse('api:post_detail', args=[self.post.pk])
+        )
+        self.assertWithinQueryBudget(response)
+        data = response.json()
+        self.assertEqual(data['id'], self.post.pk)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']['results']],
+            ['Комментарий'],
+        )
+
+    def test_unchanged_feed_is_not_modified(self):
+        url = reverse('api:index')
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'no-cache, public')
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_follow_feed_is_private(self):
+        url = reverse('api:follow_index')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.reader_client.get(url)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.json()['results'], [])
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()['results']), POSTS_QUANTITY)
+
+    def test_missing_objects_leave_no_cache_tags(self):
+        cases = (
+            ('api:group_posts', 'missing', caching.group_tags('missing')),
+            ('api:profile', 'missing', caching.profile_tags('missing')),
+            ('api:post_detail', 999, (caching.post_tag(999),)),
+        )
+        for name, arg, tags in cases:
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name, args=[arg]))
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertEqual(response.json(), {'detail': 'Не найдено.'})
+                self.assertFalse(known(tags))
+
+    def test_post_detail_changes_with_author(self):
+        url = reverse('api:post_detail', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        self.author.username = 'renamed'
+        self.author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['author'], 'renamed')
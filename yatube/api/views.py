@@ -0,0 +1,176 @@
+"""JSON API лент только для чтения.
+
+Из базы читаются только нужные столбцы (`.values()`), страницы
+листаются курсором, как и HTML-ленты. ETag и Last-Modified считаются
+по поколениям тегов кэша (`posts.caching`) без запросов к базе,
+поэтому повторный запрос с `If-None-Match` получает 304, не трогая
+ни базу, ни сериализацию.
+"""
+from functools import wraps
+from http import HTTPStatus
+from urllib.parse import urlencode
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from core.cache import condition_versioned
+from core.queries import query_budget
+from core.utils import COMMENTS_QUANTITY, paginatorr
+from posts import caching, counters
+from posts.models import Comment, Group, Post, User
+
+ORDERING = ('pub_date', 'id')
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'author__username', 'group__slug', 'image',
+)
+COMMENT_FIELDS = ('id', 'text', 'created', 'author__username')
+FEED_FIELDS = ('id', 'pub_date', *(f'post__{name}' for name in POST_FIELDS))
+
+
+def _image_url(name):
+    return Post._meta.get_field('image').storage.url(name) if name else None
+
+
+def _post(row, prefix=''):
+    return {
+        'id': row[f'{prefix}id'],
+        'text': row[f'{prefix}text'],
+        'pub_date': row[f'{prefix}pub_date'],
+        'author': row[f'{prefix}author__username'],
+        'group': row[f'{prefix}group__slug'],
+        'image': _image_url(row[f'{prefix}image']),
+    }
+
+
+def _comment(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'created': row['created'],
+        'author': row['author__username'],
+    }
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    return request.build_absolute_uri(
+        f'{request.path}?{urlencode({"cursor": cursor})}'
+    )
+
+
+def _page(request, rows, serialize, **paginator_options):
+    page_obj = paginatorr(rows, request, **paginator_options)
+    return {
+        'count': page_obj.paginator.count,
+        'next': _page_url(request, page_obj.next_cursor),
+        'previous': _page_url(request, page_obj.previous_cursor),
+        'results': [serialize(row) for row in page_obj],
+    }
+
+
+def login_required_json(view_func):
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Нужна авторизация.'},
+                status=HTTPStatus.UNAUTHORIZED,
+            )
+        return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+def json_not_found(view_func):
+    """Отвечает на Http404 JSON-ом, а не HTML-страницей."""
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse(
+                {'detail': 'Не найдено.'}, status=HTTPStatus.NOT_FOUND,
+            )
+    return _wrapped_view
+
+
+def _post_detail_tags(request, post_id):
+    # В ответе есть автор и группа поста: их изменения тоже меняют ETag.
+    tags = [caching.post_tag(post_id)]
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug').first()
+    if post is not None:
+        username, slug = post
+        tags.append(caching.author_tag(username))
+        if slug is not None:
+            tags.append(caching.group_tag(slug))
+    return tags
+
+
+@require_safe
+@json_not_found
+@condition_versioned(lambda request: caching.index_tags())
+@query_budget(5)
+def index(request):
+    rows = Post.objects.order_by(*ORDERING).values(*POST_FIELDS)
+    return JsonResponse(_page(
+        request, rows, _post, count=counters.total(), ordering=ORDERING))
+
+
+@require_safe
+@json_not_found
+@condition_versioned(
+    lambda request, slug: caching.group_tags(slug),
+    exists=caching.group_exists)
+@query_budget(6)
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    rows = group.posts.order_by(*ORDERING).values(*POST_FIELDS)
+    return JsonResponse(_page(
+        request, rows, _post, count=counters.for_group(group.pk),
+        ordering=ORDERING))
+
+
+@require_safe
+@json_not_found
+@condition_versioned(
+    lambda request, username: caching.profile_tags(username),
+    exists=caching.author_exists)
+@query_budget(6)
+def profile(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    rows = author.posts.order_by(*ORDERING).values(*POST_FIELDS)
+    return JsonResponse(_page(
+        request, rows, _post, count=counters.for_author(author.pk),
+        ordering=ORDERING))
+
+
+@require_safe
+@json_not_found
+@login_required_json
+@condition_versioned(
+    lambda request: caching.follow_tags(request.user.pk), private=True)
+@query_budget(5)
+def follow_index(request):
+    rows = request.user.feed.order_by(*ORDERING).values(*FEED_FIELDS)
+    return JsonResponse(_page(
+        request, rows, lambda row: _post(row, prefix='post__'),
+        ordering=ORDERING))
+
+
+@require_safe
+@json_not_found
+@condition_versioned(_post_detail_tags, exists=caching.post_exists)
+@query_budget(5)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.values(*POST_FIELDS), pk=post_id)
+    rows = Comment.objects.filter(post_id=post_id).order_by(
+        'created', 'id').values(*COMMENT_FIELDS)
+    return JsonResponse({
+        **_post(post),
+        'comments': _page(
+            request, rows, _comment, per_page=COMMENTS_QUANTITY,
+            ordering=('created', 'id')),
+    })
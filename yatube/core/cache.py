@@ -0,0 +1,290 @@
+"""Кэш страниц с версиями по тегам и защитой от лавины пересчётов.
+
+Каждый тег (`posts`, `group:<slug>`, ...) хранит в кэше номер поколения.
+Запись кэша помнит поколения тегов, с которыми она построена, а изменение
+данных выдаёт тегам новые поколения - старые записи перестают совпадать
+и пересобираются при следующем запросе. Поэтому TTL можно держать долгим
+без потери свежести.
+
+Пересобирает запись только тот, кто первым взял блокировку; остальные
+в это время получают устаревшее значение. Незадолго до истечения срока
+запись вероятностно обновляется заранее (алгоритм XFetch), тем раньше,
+чем дольше она строится, так что одновременного промаха не происходит.
+
+`condition_versioned` строит по тем же поколениям ETag и Last-Modified:
+повторный запрос с `If-None-Match` получает 304 до запросов к базе
+и отрисовки шаблона.
+"""
+import hashlib
+import math
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.http import Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+GENERATION_KEY = 'generation:{}'
+PAGE_KEY = 'page.{}.{}.{}'
+PAGE_TIMEOUT = 60 * 60
+# Сколько устаревшая запись ещё живёт, чтобы её можно было отдавать.
+STALE_TIMEOUT = 5 * 60
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 1
+LOCK_POLL_INTERVAL = 0.05
+# Чем больше beta, тем раньше запись обновляется до истечения срока.
+BETA = 1.0
+
+
+def _new_generation():
+    return time.time_ns()
+
+
+def _hash(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def _generation_key(tag):
+    # Теги содержат слаги и имена пользователей, поэтому в ключ идёт хэш.
+    return GENERATION_KEY.format(_hash(tag))
+
+
+def generations(tags):
+    """Текущие поколения тегов; недостающие заводятся заново."""
+    keys = [_generation_key(tag) for tag in tags]
+    found = default_cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            default_cache.add(key, _new_generation(), None)
+        found.update(default_cache.get_many(missing))
+    return tuple(found.get(key) for key in keys)
+
+
+def known(tags):
+    """Есть ли у всех тегов поколения; новых не заводит."""
+    keys = [_generation_key(tag) for tag in tags]
+    return len(default_cache.get_many(keys)) == len(keys)
+
+
+def bump(*tags):
+    """Выдаёт тегам новые поколения, сбрасывая зависимые записи."""
+    generation = _new_generation()
+    default_cache.set_many(
+        {_generation_key(tag): generation for tag in tags}, None
+    )
+
+
+def versions_etag(versions, *extra):
+    """ETag по готовому набору поколений."""
+    return _hash(':'.join(str(part) for part in (*versions, *extra)))
+
+
+def versions_last_modified(versions):
+    return datetime.fromtimestamp(max(versions) / 10 ** 9, tz=timezone.utc)
+
+
+def tags_etag(tags, *extra):
+    """ETag, который меняется вместе с поколениями тегов.
+
+    `extra` - всё, от чего ещё зависит ответ (например, пользователь).
+    """
+    return versions_etag(generations(tags), *extra)
+
+
+def tags_last_modified(tags):
+    """Время последнего сброса тегов для заголовка Last-Modified."""
+    return versions_last_modified(generations(tags))
+
+
+def _is_fresh(entry, version, beta):
+    entry_version, value, delta, expiry = entry
+    if entry_version != version:
+        return False
+    early = delta * beta * math.log(1 - random.random())
+    return time.time() - early < expiry
+
+
+def _wait_for(key, version, cache):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry
+    return None
+
+
+def get_or_compute(key, compute, timeout, version=None, cacheable=None,
+                   beta=BETA, cache=default_cache):
+    """Значение из кэша или результат `compute()`, посчитанный однажды.
+
+    Устаревшую запись пересчитывает один процесс, остальные отдают
+    старое значение. При пустом кэше ожидающие недолго ждут результат
+    и считают сами, только если не дождались. `cacheable` решает,
+    можно ли сохранять полученное значение.
+    """
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, version, beta):
+        return entry[1]
+    lock_key = f'{key}.lock'
+    # Метка отличает свою блокировку от взятой другим воркером, когда
+    # своя истекла за долгий расчёт.
+    token = uuid.uuid4().hex
+    locked = cache.add(lock_key, token, LOCK_TIMEOUT)
+    if not locked:
+        if entry is None:
+            entry = _wait_for(key, version, cache)
+        if entry is not None:
+            return entry[1]
+    try:
+        started = time.time()
+        value = compute()
+        finished = time.time()
+        if cacheable is None or cacheable(value):
+            expiry, ttl = math.inf, None
+            if timeout is not None:
+                expiry, ttl = finished + timeout, timeout + STALE_TIMEOUT
+            cache.set(
+                key, (version, value, finished - started, expiry), ttl
+            )
+    finally:
+        if locked and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    return value
+
+
+def _is_cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def _page_key(request, key_prefix):
+    return PAGE_KEY.format(
+        key_prefix,
+        _hash(request.build_absolute_uri()),
+        _hash(request.META.get('HTTP_COOKIE', '')),
+    )
+
+
+def cache_page_versioned(timeout, key_prefix='', tags=None):
+    """Замена `cache_page` со сбросом по тегам и защитой от лавины.
+
+    `tags` получает именованные аргументы view и возвращает её теги.
+    Ответ зависит от пользователя, поэтому кэш разделяется по Cookie;
+    заголовки клиентского кэширования не выставляются, чтобы браузеры
+    не держали страницу весь долгий TTL. Ответ помнит поколения, с
+    которыми построен (`tag_versions`): по ним `condition_versioned`
+    строит ETag устаревшей копии, отданной во время пересчёта.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_func(request, *args, **kwargs)
+            version = generations(tags(**kwargs)) if tags else None
+
+            def render_page():
+                response = view_func(request, *args, **kwargs)
+                patch_vary_headers(response, ('Cookie',))
+                response.tag_versions = version
+                return response
+
+            return get_or_compute(
+                _page_key(request, key_prefix),
+                render_page,
+                timeout,
+                version=version,
+                cacheable=_is_cacheable,
+            )
+        return _wrapped_view
+    return decorator
+
+
+def _user_extra(request):
+    return (
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+
+
+def _request_tags(request, tags, exists, kwargs):
+    request_tags = tags(request, **kwargs)
+    if (exists is not None and not known(request_tags)
+            and not exists(request, **kwargs)):
+        raise Http404
+    return request_tags
+
+
+def _set_validators(response, versions, extra, private):
+    response['ETag'] = quote_etag(versions_etag(versions, *extra))
+    if not private:
+        response['Last-Modified'] = http_date(
+            versions_last_modified(versions).timestamp())
+
+
+def condition_versioned(tags, private=False, exists=None):
+    """Условные ответы (304) по поколениям тегов.
+
+    `tags`, как `etag_func` у `condition`, получает запрос и именованные
+    аргументы view. Ответ можно хранить, но перед показом нужно сверить
+    с сервером. Ответ `private` зависит от пользователя: его ETag
+    включает пользователя и CSRF-токен из cookie (вход выдаёт новый
+    токен, и страница с формой должна прийти заново), а хранит такой
+    ответ только браузер. Last-Modified у него нет: по дате нельзя
+    понять, что сменился токен.
+
+    `exists` с теми же аргументами проверяет, что объект страницы есть.
+    Его спрашивают, только пока у тегов нет поколений, и при `False`
+    отвечают 404, не заводя их: иначе каждый случайный адрес оставлял
+    бы в кэше вечный ключ.
+
+    Если view отдала ответ, построенный по другим поколениям (устаревшую
+    копию из `cache_page_versioned`), валидаторы строятся по ним, а не
+    по текущим: иначе клиент подтверждал бы старую страницу ответом 304
+    до следующего сброса тегов.
+    """
+    def versioned_tags(request, **kwargs):
+        # `condition` спрашивает и ETag, и Last-Modified: теги и проверка
+        # `exists` считаются один раз на запрос.
+        if not hasattr(request, '_versioned_tags'):
+            request._versioned_tags = _request_tags(
+                request, tags, exists, kwargs)
+        return request._versioned_tags
+
+    def extra(request):
+        return _user_extra(request) if private else ()
+
+    def etag(request, **kwargs):
+        return tags_etag(versioned_tags(request, **kwargs), *extra(request))
+
+    def last_modified(request, **kwargs):
+        return tags_last_modified(versioned_tags(request, **kwargs))
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            versions = getattr(response, 'tag_versions', None)
+            if versions:
+                _set_validators(response, versions, extra(request), private)
+            if private:
+                patch_cache_control(response, no_cache=True, private=True)
+                patch_vary_headers(response, ('Cookie',))
+            else:
+                patch_cache_control(response, no_cache=True, public=True)
+            return response
+        return condition(
+            etag_func=etag,
+            last_modified_func=None if private else last_modified,
+        )(_wrapped_view)
+    return decorator
@@ -0,0 +1,289 @@
+"""Общий для всех процессов хоста кэш в файле SQLite.
+
+В отличие от LocMemCache, копию кэша не держит каждый воркер: все
+процессы читают и пишут один файл в режиме WAL, поэтому попадания
+не падают с ростом числа воркеров, а сброс поколений виден сразу всем.
+Внешний сервер не нужен.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_SIZE': 64 * 2 ** 20},
+        }
+    }
+
+При превышении MAX_ENTRIES записей или MAX_SIZE байт сначала удаляются
+просроченные записи, затем давно не читанные (LRU). Время последнего
+чтения обновляется не чаще раза в ACCESS_RESOLUTION секунд, чтобы
+чтения почти не превращались в записи. `stats()` возвращает число
+попаданий и промахов всех процессов.
+
+Заполненность не пересчитывается после каждой записи: процесс ведёт
+оценку - последний подсчёт плюс свои вставки - и считает заново, когда
+оценка доходит до предела или каждые CULL_CHECK_EVERY записей, чтобы
+заметить записи других процессов.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+ACCESS_RESOLUTION = 1
+STATS_FLUSH_EVERY = 100
+CULL_CHECK_EVERY = 100
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,'
+    ' accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS stats ('
+    ' name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = options.get('MAX_SIZE')
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending = {'hits': 0, 'misses': 0}
+        self._cull_lock = threading.Lock()
+        # Записей и байт по последнему подсчёту плюс свои вставки.
+        self._estimate = None
+        self._writes = 0
+
+    @property
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, statements):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = [
+                connection.execute(sql, args).rowcount
+                for sql, args in statements
+            ]
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._pending[name] += amount
+            if sum(self._pending.values()) < STATS_FLUSH_EVERY:
+                return
+        self._flush_stats()
+
+    def _flush_stats(self):
+        with self._stats_lock:
+            pending, self._pending = self._pending, {'hits': 0, 'misses': 0}
+        self._write(
+            (
+                'INSERT INTO stats (name, value) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET value = value + ?',
+                (name, amount, amount),
+            )
+            for name, amount in pending.items() if amount
+        )
+
+    def _fetch(self, keys):
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection.execute(
+            f'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})',
+            keys,
+        ).fetchall()
+        found, expired, touched = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            found[key] = pickle.loads(value)
+            if now - accessed >= ACCESS_RESOLUTION:
+                touched.append(key)
+        statements = [
+            ('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+            for key in expired
+        ] + [
+            ('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            for key in touched
+        ]
+        if statements:
+            self._write(statements)
+        self._count('hits', len(found))
+        self._count('misses', len(keys) - len(found))
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        if not made:
+            return {}
+        found = self._fetch(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def _store(self, data, timeout, replace=True):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        statements = []
+        if not replace:
+            placeholders = ', '.join('?' * len(data))
+            statements.append((
+                f'DELETE FROM cache WHERE key IN ({placeholders}) '
+                'AND expires <= ?',
+                [*data, now],
+            ))
+        mode = 'REPLACE' if replace else 'IGNORE'
+        size = 0
+        for key, value in data.items():
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            size += len(blob)
+            statements.append((
+                f'INSERT OR {mode} INTO cache '
+                '(key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, sqlite3.Binary(blob), expires, now, len(blob)),
+            ))
+        changed = self._write(statements)[-len(data):]
+        self._cull(len(data), size)
+        return changed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._store({key: value}, timeout, replace=False)[0] == 1
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._store({key: value}, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        made = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            made[key] = value
+        if made:
+            self._store(made, timeout)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        return self._write([(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )])[0] == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        for key in made:
+            self.validate_key(key)
+        self._write(
+            ('DELETE FROM cache WHERE key = ?', (key,)) for key in made
+        )
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._write([('DELETE FROM cache', ())])
+
+    def _too_full(self, entries, size):
+        return entries > self._max_entries or (
+            self._max_size is not None and size > self._max_size)
+
+    def _cull(self, added, added_size):
+        with self._cull_lock:
+            self._writes += 1
+            if self._estimate is not None and self._writes < CULL_CHECK_EVERY:
+                entries = self._estimate[0] + added
+                size = self._estimate[1] + added_size
+                # Замены и удаления оценку только завышают.
+                if not self._too_full(entries, size):
+                    self._estimate = (entries, size)
+                    return
+            self._writes = 0
+            self._estimate = None
+        entries, size = self._connection.execute(
+            'SELECT COUNT(*), TOTAL(size) FROM cache'
+        ).fetchone()
+        if not self._too_full(entries, size):
+            with self._cull_lock:
+                self._estimate = (entries, size)
+            return
+        statements = [
+            ('DELETE FROM cache WHERE expires <= ?', (time.time(),)),
+        ]
+        if self._cull_frequency == 0:
+            statements.append(('DELETE FROM cache', ()))
+        else:
+            statements.append((
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(entries // self._cull_frequency, 1),),
+            ))
+        self._write(statements)
+
+    def stats(self):
+        """Попадания и промахи всех процессов, число записей и байт."""
+        self._flush_stats()
+        connection = self._connection
+        stats = {'hits': 0, 'misses': 0}
+        stats.update(connection.execute('SELECT name, value FROM stats'))
+        entries, size = connection.execute(
+            'SELECT COUNT(*), TOTAL(size) FROM cache'
+        ).fetchone()
+        stats.update(entries=entries, size=int(size))
+        return stats
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами, как и у LocMemCache.
+        pass
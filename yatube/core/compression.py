@@ -0,0 +1,95 @@
+"""Сжатие gzip и brotli для ответов и статики.
+
+brotli необязателен: без пакета `brotli` всё сжимается только gzip.
+"""
+import gzip
+
+from django.utils.text import compress_sequence as gzip_sequence
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Уровни для ответов, которые сжимаются на каждый запрос: дороже
+# сжимать нет смысла, выигрыш в размере меньше потерянного времени.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Статика сжимается один раз при сборке, поэтому сильнее всего.
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+# При равных весах в Accept-Encoding выбирается то, что раньше.
+ENCODINGS = ('br', 'gzip')
+
+
+def available(encoding):
+    return encoding == 'gzip' or brotli is not None
+
+
+def _weights(request):
+    """Веса кодировок из Accept-Encoding: `gzip;q=0` - отказ от gzip."""
+    weights = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, *params = item.split(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    return weights
+
+
+def _weight(weights, encoding):
+    return weights.get(encoding, weights.get('*', 0.0))
+
+
+def accepts(request, encoding):
+    return _weight(_weights(request), encoding) > 0
+
+
+def preferred(request):
+    """Принимаемые клиентом кодировки, от самой желанной."""
+    weights = _weights(request)
+    return sorted(
+        (encoding for encoding in ENCODINGS
+         if _weight(weights, encoding) > 0),
+        key=lambda encoding: -_weight(weights, encoding),
+    )
+
+
+def negotiate(request):
+    """Лучшее сжатие, которое примет клиент и умеет сервер, или None."""
+    for encoding in preferred(request):
+        if available(encoding):
+            return encoding
+    return None
+
+
+def compress(data, encoding, static=False):
+    if encoding == 'br':
+        return brotli.compress(
+            data, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(
+        data, compresslevel=STATIC_GZIP_LEVEL if static else GZIP_LEVEL,
+        mtime=0)
+
+
+def compress_sequence(chunks, encoding):
+    """Сжимает поток, выталкивая каждый кусок сразу, а не в конце."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    yield from gzip_sequence(chunks)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Разбирает все шаблоны заранее и сообщает об ошибках в них. '
+        'Воркеры делают то же при запуске (yatube/wsgi.py).'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count, errors = templates.warm()
+        elapsed = (time.perf_counter() - started) * 1000
+        for name, error in errors.items():
+            self.stderr.write(f'{name}: {error}')
+        if errors:
+            raise CommandError(f'Шаблонов с ошибками: {len(errors)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Разобрано шаблонов: {count} за {elapsed:.0f} мс'
+        ))
@@ -0,0 +1,184 @@
+import logging
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date
+
+from . import compression
+from .queries import QueryBudgetExceeded, record_queries
+from .staticfiles import SUFFIXES
+from .templates import record_renders
+
+logger = logging.getLogger('yatube.queries')
+
+
+class QueryBudgetMiddleware:
+    """Отчёт о SQL-запросах каждого запроса и контроль бюджета view.
+
+    Число запросов, время в базе и время отрисовки шаблонов уходят
+    в заголовок `Server-Timing` и в лог `yatube.queries`; отчёт также
+    доступен тестам как `response.query_report`. Превышение бюджета
+    пишется в лог предупреждением, а при `QUERY_BUDGET_STRICT`
+    приводит к ошибке. Тело потокового ответа отдаётся уже после
+    middleware, и его запросы в отчёт не попадают.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        with record_queries() as recorder, record_renders() as renders:
+            response = self.get_response(request)
+        report = recorder.as_dict()
+        report.update(renders.as_dict())
+        report.update(
+            view=getattr(request.resolver_match, 'view_name', None),
+            path=request.path,
+            budget=request.query_budget,
+        )
+        response.query_report = report
+        timing = (
+            f'db;dur={report["db_time_ms"]};'
+            f'desc="{report["queries"]} queries", '
+            f'tpl;dur={report["template_time_ms"]}'
+        )
+        if response.has_header('Server-Timing'):
+            timing = f'{response["Server-Timing"]}, {timing}'
+        response['Server-Timing'] = timing
+        logger.info(
+            '%(view)s: %(queries)d queries in %(db_time_ms)s ms, '
+            'templates in %(template_time_ms)s ms', report,
+            extra={'query_report': report},
+        )
+        budget = request.query_budget
+        if budget is not None and report['queries'] > budget:
+            message = (
+                f'{report["view"]} выполнил {report["queries"]} '
+                f'SQL-запросов при бюджете {budget}'
+            )
+            logger.warning(message, extra={'query_report': report})
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+
+class CompressionMiddleware:
+    """Сжимает HTML и JSON brotli или gzip - что примет клиент.
+
+    Уже сжатые ответы (ленты, карта сайта) не трогаются. Токен CSRF
+    маскируется заново в каждом ответе, поэтому сжатие не открывает
+    его для атаки BREACH.
+    """
+    content_types = ('text/html', 'application/json')
+    min_length = 200
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get('Content-Type', '').split(';')[0]
+        if (content_type not in self.content_types
+                or response.has_header('Content-Encoding')):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(request)
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compression.compress_sequence(
+                response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < self.min_length:
+                return response
+            compressed = compression.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        # Сжатое тело побайтно другое: сильный ETag становится слабым.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        response['Content-Encoding'] = encoding
+        return response
+
+
+class StaticFilesMiddleware:
+    """Раздаёт собранную статику из STATIC_ROOT с заранее сжатыми копиями.
+
+    Файлы с хэшем в имени неизменны и кэшируются браузером на год,
+    остальные - ненадолго.
+    """
+    immutable_max_age = 60 * 60 * 24 * 365
+    max_age = 60
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = settings.STATIC_ROOT
+        self.hashed = set(
+            getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if (request.method in ('GET', 'HEAD') and self.root
+                and request.path.startswith(self.prefix)):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        content_type = mimetypes.guess_type(path)[0]
+        encoding = None
+        for candidate in compression.preferred(request):
+            if os.path.isfile(path + SUFFIXES[candidate]):
+                encoding = candidate
+                path += SUFFIXES[candidate]
+                break
+        stat = os.stat(path)
+        # У каждой сжатой копии свой ETag: тела у них разные.
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        last_modified = http_date(stat.st_mtime)
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+        else:
+            response = FileResponse(open(path, 'rb'))
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        response['Content-Length'] = str(stat.st_size)
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if name in self.hashed:
+            patch_cache_control(
+                response, public=True, immutable=True,
+                max_age=self.immutable_max_age)
+        else:
+            patch_cache_control(response, public=True, max_age=self.max_age)
+        conditional = get_conditional_response(
+            request, etag=etag, last_modified=int(stat.st_mtime),
+            response=response)
+        if conditional is not response:
+            response.close()
+        return conditional
@@ -10,3 +10,21 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class StoredFile(models.Model):
+    sha256 = models.CharField(
+        verbose_name='SHA-256', max_length=64, unique=True)
+    name = models.CharField(verbose_name='Имя файла', max_length=255)
+    references = models.PositiveIntegerField(
+        verbose_name='Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = ('Файл')
+        verbose_name_plural = ('Файлы')
+        indexes = [
+            models.Index(fields=['name'], name='stored_file_name_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,98 @@
+"""Учёт SQL-запросов, которые выполняет один HTTP-запрос.
+
+Бюджет объявляется у view декоратором `query_budget`, а проверяет его
+`core.middleware.QueryBudgetMiddleware`.
+"""
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# Управление транзакциями работы не добавляет, а в тестах каждый
+# get_or_create обёрнут в точку сохранения - такие запросы не считаются.
+# PRAGMA выполняются при открытии соединения (`core.db`), а без
+# CONN_MAX_AGE оно открывается в каждом запросе - это тоже не работа view.
+UNCOUNTED_STATEMENTS = (
+    'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT',
+    'PRAGMA',
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """Обёртка `execute_wrapper`: число, время и повторы запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.startswith(UNCOUNTED_STATEMENTS):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """Сколько раз повторялись одинаковые запросы (признак N+1)."""
+        return sum(
+            count - 1 for count in self.statements.values() if count > 1
+        )
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_time_ms': round(self.duration * 1000, 2),
+            'duplicates': self.duplicates,
+        }
+
+
+@contextmanager
+def record_queries():
+    """Записывает запросы ко всем базам внутри блока `with`."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def query_budget(limit):
+    """Объявляет, сколько SQL-запросов может выполнить view.
+
+    Считаются запросы до возврата ответа. Запросы, которые
+    `StreamingHttpResponse` делает во время отдачи тела, middleware уже
+    не видит: бюджет потоковой view покрывает только работу до потока.
+    """
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+class QueryBudgetTestMixin:
+    """Проверки отчёта `QueryBudgetMiddleware` для `TestCase`."""
+
+    def assertWithinQueryBudget(self, response):
+        report = response.query_report
+        self.assertIsNotNone(
+            report['budget'], f'У {report["view"]} не объявлен бюджет'
+        )
+        self.assertLessEqual(
+            report['queries'], report['budget'],
+            f'{report["view"]} превысил бюджет SQL-запросов',
+        )
+        self.assertEqual(
+            report['duplicates'], 0,
+            f'{report["view"]} повторяет одни и те же запросы',
+        )
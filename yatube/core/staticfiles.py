@@ -0,0 +1,51 @@
+"""Сборка статики с хэшами в именах и заранее сжатыми копиями.
+
+`collectstatic` с `CompressedManifestStaticFilesStorage` кладёт рядом
+с каждым хэшированным текстовым файлом `.gz` и, если установлен
+brotli, `.br`. Раздаёт их `StaticFilesMiddleware`: имя с хэшем
+меняется вместе с содержимым, поэтому такие файлы кэшируются на год.
+
+Файл, которого нет в манифесте (collectstatic ещё не запускали или
+файла нет в исходниках), отдаётся под исходным именем, а не роняет
+страницу с `{% static %}`.
+"""
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from . import compression
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.xml', '.json', '.map')
+SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if name.endswith(COMPRESSIBLE):
+                yield from self._compress(name)
+
+    def _compress(self, name):
+        with self.open(name) as file:
+            data = file.read()
+        for encoding, suffix in SUFFIXES.items():
+            if not compression.available(encoding):
+                continue
+            compressed = compression.compress(data, encoding, static=True)
+            # Несжимаемые файлы оставляем как есть: копия только мешает.
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+            yield name, name + suffix, True
@@ -0,0 +1,77 @@
+"""Файловое хранилище без повторов одинакового содержимого.
+
+Каждый сохранённый файл записывается в `StoredFile` вместе с sha256
+содержимого. Если та же картинка загружается снова, новый файл не
+пишется: `_save` возвращает имя уже сохранённого, а значит и миниатюры
+sorl, ключ которых строится по имени, находятся готовыми. Имя файла
+остаётся именем первой загрузки (`posts/<имя>`), а не хэшем, чтобы
+не менять адреса уже опубликованных картинок.
+
+Сколько строк ссылается на файл, считают `acquire` и `release`; когда
+ссылок не остаётся, файл и его миниатюры удаляются.
+"""
+import hashlib
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .models import StoredFile
+
+
+def content_hash(content):
+    # ImageUploadHandler уже посчитал хэш, пока принимал файл.
+    sha256 = getattr(content, 'sha256', None)
+    if sha256:
+        return sha256
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DeduplicatingStorage(FileSystemStorage):
+    def _save(self, name, content):
+        sha256 = content_hash(content)
+        stored = StoredFile.objects.filter(sha256=sha256).first()
+        if stored is not None and self.exists(stored.name):
+            return stored.name
+        name = super()._save(name, content)
+        try:
+            with transaction.atomic():
+                StoredFile.objects.update_or_create(
+                    sha256=sha256, defaults={'name': name}
+                )
+        except IntegrityError:
+            # Тот же файл одновременно сохранил другой запрос.
+            super().delete(name)
+            return StoredFile.objects.get(sha256=sha256).name
+        return name
+
+
+def acquire(name):
+    """Добавляет ссылку на сохранённый файл."""
+    StoredFile.objects.filter(name=name).update(
+        references=F('references') + 1
+    )
+
+
+def release(name, storage):
+    """Убирает ссылку на файл и удаляет его, если ссылок не осталось.
+
+    Файлы, сохранённые до появления хранилища, в `StoredFile` не
+    записаны и не удаляются.
+    """
+    with transaction.atomic():
+        StoredFile.objects.filter(name=name, references__gt=0).update(
+            references=F('references') - 1
+        )
+        deleted, _ = StoredFile.objects.filter(
+            name=name, references=0
+        ).delete()
+    if deleted:
+        transaction.on_commit(
+            lambda: delete_with_thumbnails(ImageFile(name, storage))
+        )
@@ -0,0 +1,108 @@
+"""Время отрисовки шаблонов и прогрев кэша шаблонов.
+
+Бэкенд `DjangoTemplates` - обычный бэкенд Django, который засекает,
+сколько рисуется каждый шаблон, отданный view (вложенные `include`
+входят в время своего шаблона). `QueryBudgetMiddleware` кладёт это
+время в отчёт о запросе рядом с SQL.
+
+С кэширующим загрузчиком шаблон разбирается один раз на процесс, при
+первом обращении. `warm` разбирает все шаблоны заранее, чтобы первый
+запрос воркера не платил за чтение и разбор десятков файлов.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template import TemplateSyntaxError, engines
+from django.template.backends import django as django_backend
+
+_renders = ContextVar('template_renders', default=None)
+
+
+class RenderRecorder:
+    """Отрисованные шаблоны и суммарное время их отрисовки."""
+
+    def __init__(self):
+        self.templates = []
+        self.duration = 0.0
+
+    def add(self, name, duration):
+        self.templates.append(name)
+        self.duration += duration
+
+    def as_dict(self):
+        return {
+            'templates': self.templates,
+            'template_time_ms': round(self.duration * 1000, 2),
+        }
+
+
+@contextmanager
+def record_renders():
+    """Записывает шаблоны, отрисованные внутри блока `with`."""
+    recorder = RenderRecorder()
+    token = _renders.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _renders.reset(token)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            recorder = _renders.get()
+            if recorder is not None:
+                recorder.add(
+                    self.origin.template_name,
+                    time.perf_counter() - started,
+                )
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+
+def _loader_dirs(loaders):
+    for loader in loaders:
+        # Кэширующий загрузчик сам каталогов не знает, их знают вложенные.
+        yield from _loader_dirs(getattr(loader, 'loaders', ()))
+        if hasattr(loader, 'get_dirs'):
+            yield from loader.get_dirs()
+
+
+def template_names(engine):
+    """Имена всех шаблонов из каталогов, которые смотрят загрузчики."""
+    names = set()
+    for directory in set(_loader_dirs(engine.template_loaders)):
+        for root, _, files in os.walk(directory):
+            for file in files:
+                path = os.path.join(root, file)
+                names.add(os.path.relpath(path, directory).replace(
+                    os.sep, '/'))
+    return sorted(names)
+
+
+def warm():
+    """Разбирает все шаблоны; возвращает (число, ошибки по именам)."""
+    count, errors = 0, {}
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        for name in template_names(engine):
+            try:
+                backend.get_template(name)
+            except TemplateSyntaxError as error:
+                errors[name] = error
+            else:
+                count += 1
+    return count, errors
@@ -0,0 +1,382 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+
+from . import compression
+from .cache import bump, generations, get_or_compute
+from .cache_backends import CULL_CHECK_EVERY, SQLiteCache
+from .db import apply_sqlite_pragmas
+from .middleware import QueryBudgetMiddleware, StaticFilesMiddleware
+from .queries import QueryBudgetExceeded, query_budget
+from .uploads import ImageUploadHandler, StreamedImageFile
+
+User = get_user_model()
+
+
+class SingleFlightCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fresh_value_is_not_recomputed(self):
+        self.assertEqual(get_or_compute('key', lambda: 1, 60), 1)
+        self.assertEqual(get_or_compute('key', lambda: 2, 60), 1)
+
+    def test_stale_value_served_while_locked(self):
+        version = generations(['tag'])
+        get_or_compute('key', lambda: 'old', 60, version=version)
+        bump('tag')
+        cache.add('key.lock', True)
+        value = get_or_compute(
+            'key', lambda: 'new', 60, version=generations(['tag']))
+        self.assertEqual(value, 'old')
+        cache.delete('key.lock')
+        value = get_or_compute(
+            'key', lambda: 'new', 60, version=generations(['tag']))
+        self.assertEqual(value, 'new')
+
+    @mock.patch('core.cache.LOCK_WAIT', 0)
+    def test_foreign_lock_survives_computing_without_it(self):
+        cache.add('key.lock', 'other')
+        self.assertEqual(get_or_compute('key', lambda: 1, 60), 1)
+        self.assertEqual(cache.get('key.lock'), 'other')
+
+    def test_expired_value_is_recomputed(self):
+        cache.set('key', (None, 'old', 0, time.time() - 1), 60)
+        self.assertEqual(get_or_compute('key', lambda: 'new', 60), 'new')
+
+    def test_uncacheable_value_is_not_stored(self):
+        get_or_compute('key', lambda: None, 60, cacheable=bool)
+        self.assertIsNone(cache.get('key'))
+
+    def test_fragment_tag(self):
+        template = Template(
+            '{% load single_flight %}'
+            '{% cache 60 fragment name %}{{ value }}{% endcache %}'
+        )
+        first = template.render(Context({'name': 'a', 'value': 1}))
+        second = template.render(Context({'name': 'a', 'value': 2}))
+        other = template.render(Context({'name': 'b', 'value': 3}))
+        self.assertEqual((first, second, other), ('1', '1', '3'))
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_values_are_shared_between_instances(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.make_cache().get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(
+            self.cache.get_many(['key', 'missing']), {'key': {'value': 1}})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expired_values_are_missing(self):
+        self.cache.set('key', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 2)
+
+    def test_least_recently_used_are_evicted(self):
+        cache = self.make_cache(MAX_ENTRIES=2, CULL_FREQUENCY=2)
+        cache.set('old', 1)
+        cache.set('used', 2)
+        cache._write([('UPDATE cache SET accessed = 0 WHERE key = ?',
+                       (cache.make_key('old'),))])
+        cache.set('new', 3)
+        self.assertIsNone(cache.get('old'))
+        self.assertEqual(cache.get_many(['used', 'new']),
+                         {'used': 2, 'new': 3})
+
+    def test_size_limit(self):
+        cache = self.make_cache(MAX_SIZE=1000, CULL_FREQUENCY=1)
+        cache.set('big', 'x' * 2000)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_fullness_is_not_counted_on_every_write(self):
+        counts = []
+        self.cache._connection.set_trace_callback(
+            lambda sql: sql.startswith('SELECT COUNT') and counts.append(sql))
+        for number in range(10):
+            self.cache.set(f'key{number}', number)
+        self.assertEqual(len(counts), 1)
+
+    def test_writes_of_other_processes_are_culled(self):
+        cache = self.make_cache(MAX_ENTRIES=CULL_CHECK_EVERY + 10)
+        cache.set('first', 0)
+        other = self.make_cache()
+        other.set_many({f'other{number}': number
+                        for number in range(CULL_CHECK_EVERY + 10)})
+        for number in range(CULL_CHECK_EVERY):
+            cache.set('key', number)
+        self.assertLessEqual(
+            cache.stats()['entries'], CULL_CHECK_EVERY + 10)
+
+    def test_stats(self):
+        self.cache.set('key', 1)
+        self.cache.get('key')
+        self.cache.get('missing')
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        stats = self.make_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['entries'], 1)
+
+
+@query_budget(1)
+def greedy_view(request):
+    User.objects.count()
+    User.objects.count()
+    return HttpResponse()
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    def call_greedy_view(self):
+        def get_response(request):
+            middleware.process_view(request, greedy_view, (), {})
+            return greedy_view(request)
+
+        middleware = QueryBudgetMiddleware(get_response)
+        return middleware(RequestFactory().get('/'))
+
+    def test_report(self):
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        self.assertEqual(response.query_report['view'], 'posts:index')
+        self.assertEqual(
+            response.query_report['templates'], ['posts/index.html'])
+        self.assertEqual(response.query_report['budget'], 8)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_exceeded_budget_fails_in_strict_mode(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.call_greedy_view()
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_exceeded_budget_is_logged(self):
+        with self.assertLogs('yatube.queries', 'WARNING'):
+            response = self.call_greedy_view()
+        self.assertEqual(response.query_report['duplicates'], 1)
+
+
+class CompressionMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='compressed')
+        for number in range(5):
+            Post.objects.create(text=f'Пост {number} ' * 10, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_html_is_compressed_for_accepting_clients(self):
+        url = reverse('posts:index')
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(
+            int(response['Content-Length']), len(response.content))
+
+    def test_refused_encoding_is_not_used(self):
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_brotli_is_preferred_when_installed(self):
+        response = self.client.get(
+            reverse('api:index'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(
+            response['Content-Encoding'],
+            'br' if compression.brotli else 'gzip')
+
+    def test_precompressed_responses_are_left_alone(self):
+        response = self.client.get(
+            reverse('posts:sitemap_index'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'<sitemapindex', gzip.decompress(
+            b''.join(response.streaming_content)))
+
+
+class CompressedStaticFilesTest(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.root)
+        self.css = 'body { color: #123456; }\n' * 100
+        os.mkdir(os.path.join(self.source, 'css'))
+        with open(os.path.join(self.source, 'css', 'site.css'), 'w') as f:
+            f.write(self.css)
+        settings = override_settings(
+            STATICFILES_DIRS=[self.source], STATIC_ROOT=self.root,
+            INSTALLED_APPS=['django.contrib.staticfiles'],
+            STATICFILES_STORAGE=(
+                'core.staticfiles.CompressedManifestStaticFilesStorage'),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.hashed = staticfiles_storage.hashed_files['css/site.css']
+
+    def get(self, name, method='get', **headers):
+        middleware = StaticFilesMiddleware(
+            lambda request: HttpResponse(status=404))
+        response = middleware(getattr(RequestFactory(), method)(
+            f'/static/{name}', **headers))
+        body = (b''.join(response.streaming_content) if response.streaming
+                else response.content)
+        response.close()
+        return response, body
+
+    def test_hashed_files_get_compressed_copies(self):
+        with open(os.path.join(self.root, self.hashed + '.gz'), 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()).decode(), self.css)
+
+    def test_hashed_files_are_cached_for_a_year(self):
+        response, body = self.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(body).decode(), self.css)
+
+    def test_original_names_are_served_briefly(self):
+        response, body = self.get('css/site.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('max-age=60', response['Cache-Control'])
+        self.assertEqual(body.decode(), self.css)
+
+    def test_paths_outside_static_root_are_not_served(self):
+        response, _ = self.get('../../settings.py')
+        self.assertEqual(response.status_code, 404)
+
+    def test_refused_encoding_is_not_sent(self):
+        response, body = self.get(
+            self.hashed, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(body.decode(), self.css)
+
+    def test_head_has_headers_but_no_body(self):
+        response, body = self.get(self.hashed, method='head')
+        self.assertEqual(body, b'')
+        self.assertEqual(int(response['Content-Length']), len(self.css))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_unchanged_file_is_not_modified(self):
+        response, _ = self.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip')
+        response, body = self.get(
+            self.hashed, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b'')
+
+
+class MissingManifestTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_pages_render_before_collectstatic(self):
+        with override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_STORAGE=(
+                'core.staticfiles.CompressedManifestStaticFilesStorage'),
+        ):
+            response = self.client.get(reverse('about:author'))
+        self.assertContains(response, '/static/css/bootstrap.min.css')
+
+
+class SQLitePragmasTest(TestCase):
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1234})
+    def test_pragmas_are_applied(self):
+        apply_sqlite_pragmas(None, connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone(), (-1234,))
+
+
+class WarmTemplatesTest(TestCase):
+    def setUp(self):
+        self.templates_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.templates_dir)
+
+    def test_all_templates_are_compiled(self):
+        out = StringIO()
+        call_command('warm_templates', stdout=out)
+        self.assertIn('Разобрано шаблонов', out.getvalue())
+
+    def test_broken_template_is_reported(self):
+        with open(os.path.join(self.templates_dir, 'broken.html'), 'w') as f:
+            f.write('{% if %}')
+        templates = [{
+            'BACKEND': 'core.templates.DjangoTemplates',
+            'DIRS': [self.templates_dir],
+        }]
+        with override_settings(TEMPLATES=templates):
+            with self.assertRaisesMessage(CommandError, '1'):
+                call_command('warm_templates', stderr=StringIO())
+
+
+class ImageUploadHandlerTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.png = BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(self.png, 'PNG')
+
+    def upload(self, content, chunk_size=16):
+        handler = ImageUploadHandler()
+        with override_settings(MEDIA_ROOT=self.media_root):
+            handler.new_file('image', 'red.png', 'image/png', None)
+            for start in range(0, len(content), chunk_size):
+                handler.receive_data_chunk(
+                    content[start:start + chunk_size], start)
+            return handler.file_complete(len(content))
+
+    def test_image_is_streamed_into_media_root(self):
+        content = self.png.getvalue()
+        uploaded = self.upload(content)
+        self.assertIsInstance(uploaded, StreamedImageFile)
+        self.assertEqual(uploaded.image_size, (40, 30))
+        self.assertEqual(uploaded.image_format, 'PNG')
+        self.assertEqual(uploaded.sha256, hashlib.sha256(content).hexdigest())
+        self.assertTrue(
+            uploaded.temporary_file_path().startswith(self.media_root))
+        self.assertEqual(uploaded.read(), content)
+        uploaded.close()
+
+    def test_garbage_is_rejected(self):
+        uploaded = self.upload(b'GIF89a' + b'\x00' * 64)
+        self.assertTrue(uploaded.upload_error)
@@ -0,0 +1,173 @@
+"""Потоковый приём загружаемых картинок.
+
+`ImageUploadHandler` проверяет файл по мере поступления: сигнатуру
+формата и размеры берёт из заголовка, не декодируя картинку, а слишком
+большой или чужой файл бросает сразу, дочитывая остаток запроса впустую.
+Попутно считается sha256 содержимого. Данные пишутся во временный файл
+внутри MEDIA_ROOT, и хранилище потом просто переименовывает его, так что
+память воркера не растёт от размера и числа загрузок.
+
+Отказ обработчика становится ошибкой поля формы через
+`UploadErrorsFormMixin`; прошедший проверку файл поле формы открывает
+в Pillow уже с диска, а не из памяти.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import (SimpleUploadedFile,
+                                            TemporaryUploadedFile,
+                                            UploadedFile)
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageFile
+
+UPLOAD_TEMP_DIR = 'tmp'
+# Сколько байт начала файла можно прочитать в поисках размеров картинки.
+HEADER_LIMIT = 256 * 2 ** 10
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+SIGNATURE_LENGTH = 12
+
+NOT_AN_IMAGE = 'Загрузите картинку в формате JPEG, PNG, GIF или WebP.'
+TOO_LARGE = 'Размер файла не должен превышать {} МБ.'
+TOO_MANY_PIXELS = 'Картинка не должна быть больше {} мегапикселей.'
+
+
+def sniff_format(header):
+    """Формат картинки по первым байтам файла или None."""
+    for signature, image_format in SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+class StreamedImageFile(TemporaryUploadedFile):
+    """Загруженная картинка во временном файле внутри MEDIA_ROOT."""
+
+    def __init__(self, name, content_type, charset, content_type_extra=None):
+        directory = os.path.join(settings.MEDIA_ROOT, UPLOAD_TEMP_DIR)
+        os.makedirs(directory, exist_ok=True)
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(
+            suffix='.upload' + ext, dir=directory
+        )
+        UploadedFile.__init__(
+            self, file, name, content_type, 0, charset, content_type_extra
+        )
+        self.image_format = None
+        self.image_size = None
+        self.sha256 = None
+
+
+class RejectedImageFile(SimpleUploadedFile):
+    """Отвергнутая при приёме картинка: содержимого нет, есть причина."""
+
+    def __init__(self, name, upload_error):
+        super().__init__(name, b'')
+        self.upload_error = upload_error
+
+
+class ImageUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.max_size = settings.UPLOAD_IMAGE_MAX_SIZE
+        self.max_pixels = settings.UPLOAD_IMAGE_MAX_PIXELS
+        self.file = StreamedImageFile(
+            self.file_name, self.content_type, self.charset,
+            self.content_type_extra,
+        )
+        self.error = None
+        self.header = b''
+        self.parser = ImageFile.Parser()
+        self.hash = hashlib.sha256()
+        if self.content_length and self.content_length > self.max_size:
+            self._reject(TOO_LARGE.format(self.max_size // 2 ** 20))
+
+    def _reject(self, error):
+        self.error = error
+        self.file.close()
+
+    def _inspect(self, raw_data):
+        self.header += raw_data
+        try:
+            self.parser.feed(raw_data)
+        except Image.DecompressionBombError:
+            return self._reject(
+                TOO_MANY_PIXELS.format(self.max_pixels // 10 ** 6))
+        except Exception:
+            return self._reject(NOT_AN_IMAGE)
+        image = self.parser.image
+        if len(self.header) >= SIGNATURE_LENGTH or image is not None:
+            self.file.image_format = sniff_format(self.header)
+            if self.file.image_format is None:
+                return self._reject(NOT_AN_IMAGE)
+        if image is None:
+            if len(self.header) > HEADER_LIMIT:
+                self._reject(NOT_AN_IMAGE)
+            return None
+        width, height = image.size
+        if not width or not height:
+            return self._reject(NOT_AN_IMAGE)
+        if width * height > self.max_pixels:
+            return self._reject(
+                TOO_MANY_PIXELS.format(self.max_pixels // 10 ** 6))
+        self.file.image_size = image.size
+        self.header = self.parser = None
+        return None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        if start + len(raw_data) > self.max_size:
+            self._reject(TOO_LARGE.format(self.max_size // 2 ** 20))
+            return None
+        if self.file.image_size is None:
+            self._inspect(raw_data)
+            if self.error:
+                return None
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.error and self.file.image_size is None:
+            self._reject(NOT_AN_IMAGE)
+        if self.error:
+            return RejectedImageFile(self.file_name, self.error)
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hash.hexdigest()
+        return self.file
+
+
+class UploadErrorsFormMixin:
+    """Превращает отказы `ImageUploadHandler` в ошибки полей формы.
+
+    Отвергнутый файл убирается из `files`, чтобы поле не проверяло
+    пустышку, а причина отказа добавляется к ошибкам этого поля.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = {}
+        for name, uploaded in list(self.files.items()):
+            error = getattr(uploaded, 'upload_error', None)
+            if error:
+                if not self.upload_errors:
+                    self.files = self.files.copy()
+                self.upload_errors[name] = error
+                del self.files[name]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name, error in self.upload_errors.items():
+            self.add_error(name, ValidationError(error, code='invalid_image'))
+        return cleaned_data
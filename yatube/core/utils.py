@@ -1,9 +1,161 @@
-from django.core.paginator import Paginator
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
 
 POSTS_QUANTITY = 10
+COMMENTS_QUANTITY = 20
+KEYSET_ORDERING = ('pub_date', 'pk')
+CURSOR_SALT = 'core.utils.cursor'
+FIRST, NEXT, PREVIOUS, LAST = 'first', 'next', 'prev', 'last'
 
 
-def paginatorr(post_list, request):
-    paginator = Paginator(post_list, POSTS_QUANTITY)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+class CursorPage(Page):
+    """Страница keyset-пагинации: знает соседей, но не свой номер."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<CursorPage>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class KeysetPaginator(Paginator):
+    """Paginator, который умеет отдавать страницы по курсору.
+
+    Курсор - подписанный токен со значениями полей `ordering` крайней
+    записи страницы. Страница по курсору выбирается условием
+    `(pub_date, id) > (...)` по индексу, без COUNT(*) и OFFSET,
+    поэтому глубина страницы не влияет на стоимость запроса.
+    Обычные `?page=` страницы тоже получают курсоры на соседей.
+    Если число записей уже известно (`count`), COUNT(*) не выполняется.
+    """
+
+    def __init__(self, object_list, per_page, ordering=KEYSET_ORDERING,
+                 count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.ordering = tuple(ordering)
+        if count is not None:
+            self.count = count
+
+    @property
+    def first_cursor(self):
+        return self._encode(FIRST, None)
+
+    @property
+    def last_cursor(self):
+        return self._encode(LAST, None)
+
+    def get_cursor_page(self, cursor):
+        """Страница по курсору; битый курсор ведёт на первую страницу."""
+        try:
+            direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+            values = self._decode_values(values)
+        except (signing.BadSignature, LookupError, TypeError, ValueError):
+            return self.get_page(1)
+        backwards = direction not in (NEXT, FIRST)
+        queryset = self._seek(values, backwards)
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            page = CursorPage(rows, self, has_next=direction == PREVIOUS,
+                              has_previous=has_more)
+        else:
+            page = CursorPage(rows, self, has_next=has_more,
+                              has_previous=direction == NEXT)
+        return self._attach_cursors(page)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        page.object_list = list(page.object_list)
+        return self._attach_cursors(page)
+
+    def _attach_cursors(self, page):
+        page.next_cursor = page.previous_cursor = None
+        if not page.object_list:
+            # Курсор увёл за край ленты (записи удалили): соседей
+            # нет, поэтому ссылки ведут на ближайший край.
+            if page.has_next():
+                page.next_cursor = self.first_cursor
+            if page.has_previous():
+                page.previous_cursor = self.last_cursor
+            return page
+        if page.has_next():
+            page.next_cursor = self._encode(NEXT, page.object_list[-1])
+        if page.has_previous():
+            page.previous_cursor = self._encode(PREVIOUS, page.object_list[0])
+        return page
+
+    def _fields(self):
+        opts = self.object_list.model._meta
+        for name in self.ordering:
+            name = name.lstrip('-')
+            yield name, opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _encode(self, direction, obj):
+        values = None
+        if obj is not None:
+            # Строки бывают и моделями, и словарями из `.values()`.
+            values = [
+                obj[name] if isinstance(obj, dict) else getattr(obj, name)
+                for name, field in self._fields()
+            ]
+            values = [
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in values
+            ]
+        return signing.dumps([direction, values], salt=CURSOR_SALT)
+
+    def _decode_values(self, values):
+        if values is None:
+            return None
+        fields = list(self._fields())
+        if len(values) != len(fields):
+            raise ValueError('Курсор не соответствует сортировке.')
+        return [
+            field.to_python(value)
+            for (name, field), value in zip(fields, values)
+        ]
+
+    def _seek(self, values, backwards):
+        ordering = self.ordering
+        if backwards:
+            ordering = [
+                name[1:] if name.startswith('-') else '-' + name
+                for name in ordering
+            ]
+        queryset = self.object_list.order_by(*ordering)
+        if values is None:
+            return queryset
+        condition = Q()
+        names = [name for name, field in self._fields()]
+        for index, name in enumerate(self.ordering):
+            descending = name.startswith('-') != backwards
+            lookup = names[index] + ('__lt' if descending else '__gt')
+            equal = dict(zip(names[:index], values[:index]))
+            equal[lookup] = values[index]
+            condition |= Q(**equal)
+        # Избыточная граница по первому полю: без неё условие из OR
+        # не даёт базе начать чтение индекса с позиции курсора.
+        descending = self.ordering[0].startswith('-') != backwards
+        bound = names[0] + ('__lte' if descending else '__gte')
+        return queryset.filter(condition, **{bound: values[0]})
+
+
+def paginatorr(post_list, request, count=None, per_page=POSTS_QUANTITY,
+               ordering=KEYSET_ORDERING):
+    paginator = KeysetPaginator(
+        post_list, per_page, ordering=ordering, count=count)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
+    return paginator.get_page(request.GET.get('page'))
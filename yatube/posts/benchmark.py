@@ -0,0 +1,179 @@
+"""Нагрузочный замер страниц постов через WSGI-приложение.
+
+Запросы строит `RequestFactory` и исполняет `WSGIHandler` - тот же
+обработчик со всеми middleware, что работает на сервере, без сети.
+Каждая страница опрашивается отдельно несколькими потоками сразу;
+по ответам считаются перцентили задержки, число SQL-запросов (из
+отчёта `QueryBudgetMiddleware`) и пропускная способность.
+"""
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory
+from django.urls import reverse
+from PIL import Image
+
+from .models import Follow, Group, Post, User
+
+VIEWS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+    'post_create',
+)
+# Допустимый рост p95 относительно сохранённого замера.
+TOLERANCE = 0.2
+
+
+def _start_response(status, headers, exc_info=None):
+    pass
+
+
+def _small_image():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 80, 40)).save(buffer, 'PNG')
+    return SimpleUploadedFile(
+        'benchmark.png', buffer.getvalue(), content_type='image/png')
+
+
+class Targets:
+    """Случайные адреса страниц по засеянным данным, воспроизводимо."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.groups = list(Group.objects.values_list('slug', flat=True))
+        self.authors = list(User.objects.filter(
+            posts__isnull=False).values_list('username', flat=True)
+            .distinct().order_by())
+        self.posts = list(Post.objects.values_list('pk', flat=True))
+        reader = Follow.objects.values('user').order_by('-pk').first()
+        self.reader = User.objects.get(pk=reader['user'])
+
+    def path(self, view):
+        if view == 'group_posts':
+            return reverse('posts:group_list', args=[
+                self.rng.choice(self.groups)])
+        if view == 'profile':
+            return reverse('posts:profile', args=[
+                self.rng.choice(self.authors)])
+        if view == 'post_detail':
+            return reverse('posts:post_detail', args=[
+                self.rng.choice(self.posts)])
+        if view == 'post_create':
+            return reverse('posts:post_create')
+        return reverse(f'posts:{view}')
+
+
+class Driver:
+    """Исполняет запросы через WSGIHandler от имени читателя ленты."""
+
+    def __init__(self, user):
+        self.handler = WSGIHandler()
+        self.factory = RequestFactory()
+        client = Client()
+        client.force_login(user)
+        self.factory.cookies.update(client.cookies)
+        token_request = self.factory.get('/')
+        self.csrf_token = get_token(token_request)
+        self.factory.cookies['csrftoken'] = token_request.META['CSRF_COOKIE']
+
+    def request(self, view, path):
+        if view == 'post_create':
+            request = self.factory.post(path, {
+                'text': 'Пост из нагрузочного замера',
+                'image': _small_image(),
+            }, HTTP_X_CSRFTOKEN=self.csrf_token)
+        else:
+            request = self.factory.get(path)
+        started = time.perf_counter()
+        response = self.handler(request.environ, _start_response)
+        b''.join(response)
+        elapsed = time.perf_counter() - started
+        # Как и сервер: request_finished закрывает соединения с базой,
+        # если их не держит CONN_MAX_AGE.
+        response.close()
+        return elapsed, response.status_code, response.query_report
+
+
+def measure(driver, targets, view, requests, concurrency):
+    """Задержки, коды ответов и число SQL-запросов одной страницы."""
+    paths = [targets.path(view) for _ in range(requests)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        results = [driver.request(view, path) for path in paths]
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(
+                lambda path: driver.request(view, path), paths))
+    wall = time.perf_counter() - started
+    return summarize(results, wall)
+
+
+def summarize(results, wall):
+    latencies = sorted(elapsed * 1000 for elapsed, _, _ in results)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if (
+        len(latencies) > 1) else latencies * 99
+    return {
+        'requests': len(results),
+        'errors': sum(status >= 400 for _, status, _ in results),
+        'p50_ms': round(cuts[49], 2),
+        'p95_ms': round(cuts[94], 2),
+        'p99_ms': round(cuts[98], 2),
+        'queries': max(report['queries'] for _, _, report in results),
+        'rps': round(len(results) / wall, 1),
+    }
+
+
+def run(views=VIEWS, requests=100, concurrency=4, warmup=10, seed=0):
+    """Замеряет страницы по очереди; возвращает отчёт по каждой."""
+    targets = Targets(seed)
+    driver = Driver(targets.reader)
+    report = {}
+    for view in views:
+        if warmup:
+            measure(driver, targets, view, warmup, 1)
+        report[view] = measure(driver, targets, view, requests, concurrency)
+    return report
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """Регрессии относительно сохранённого замера, по строке на каждую."""
+    regressions = []
+    for view, current in report.items():
+        previous = baseline.get(view)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{view}: p95 {current["p95_ms"]} мс, '
+                f'было {previous["p95_ms"]} мс'
+            )
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(
+                f'{view}: {current["errors"]} ошибок, '
+                f'было {previous.get("errors", 0)}'
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{view}: {current["queries"]} SQL-запросов, '
+                f'было {previous["queries"]}'
+            )
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)['views']
+
+
+def save_baseline(path, report, options):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(
+            {'options': options, 'views': report}, file,
+            ensure_ascii=False, indent=2, sort_keys=True,
+        )
@@ -0,0 +1,115 @@
+"""Теги кэша страниц постов и их сброс при изменении данных."""
+from core.cache import bump, generations
+
+from .models import Group, Post, User
+
+INDEX = 'posts'
+# Карта сайта режется на части по диапазонам первичных ключей.
+SITEMAP_SHARD = 5000
+
+
+def group_tag(slug):
+    return f'group:{slug}'
+
+
+def author_tag(username):
+    return f'author:{username}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def follower_tag(user_id):
+    return f'follower:{user_id}'
+
+
+def sitemap_tag(section, pk):
+    return f'sitemap:{section}:{pk // SITEMAP_SHARD}'
+
+
+def index_tags():
+    return (INDEX,)
+
+
+def group_tags(slug):
+    return (group_tag(slug),)
+
+
+def profile_tags(username):
+    return (author_tag(username),)
+
+
+def follow_tags(user_id):
+    # Лента подписок меняется от любого поста и от подписок пользователя.
+    return (INDEX, follower_tag(user_id))
+
+
+def post_detail_tags(post_id):
+    # На странице поста есть счётчик постов автора, поэтому она
+    # устаревает от любого нового поста, а не только от своего.
+    return (INDEX, post_tag(post_id))
+
+
+# Проверки для `condition_versioned(exists=...)`: страница объекта,
+# которого нет, отвечает 404, не заводя поколений его тегов.
+def group_exists(request, slug):
+    return Group.objects.filter(slug=slug).exists()
+
+
+def author_exists(request, username):
+    return User.objects.filter(username=username).exists()
+
+
+def post_exists(request, post_id):
+    return Post.objects.filter(pk=post_id).exists()
+
+
+def card_tags(post):
+    # Карточка показывает и имя автора.
+    tags = [post_tag(post.pk), author_tag(post.author.username)]
+    if post.group is not None:
+        tags.append(group_tag(post.group.slug))
+    return tags
+
+
+def card_versions(posts):
+    """Версии карточек постов страницы одним обращением к кэшу."""
+    tags = {post.pk: card_tags(post) for post in posts}
+    found = iter(generations(
+        [tag for post_tags in tags.values() for tag in post_tags]
+    ))
+    return {
+        pk: ':'.join(str(next(found)) for _ in post_tags)
+        for pk, post_tags in tags.items()
+    }
+
+
+def invalidate_post(post, previous_group=None):
+    tags = [
+        INDEX, author_tag(post.author.username), post_tag(post.pk),
+        sitemap_tag('posts', post.pk), sitemap_tag('profiles', post.author_id),
+    ]
+    for group in (post.group, previous_group):
+        if group is not None:
+            tags += [group_tag(group.slug), sitemap_tag('groups', group.pk)]
+    bump(*tags)
+
+
+def invalidate_author(user):
+    # Имя автора есть на каждой странице с его постами.
+    slugs = Group.objects.filter(
+        posts__author=user).values_list('slug', flat=True).distinct()
+    bump(INDEX, author_tag(user.username), *map(group_tag, slugs))
+
+
+def invalidate_group(group):
+    bump(INDEX, group_tag(group.slug), sitemap_tag('groups', group.pk))
+
+
+def invalidate_comment(comment):
+    bump(post_tag(comment.post_id))
+
+
+def invalidate_follow(follow):
+    bump(author_tag(follow.author.username), follower_tag(follow.user_id))
@@ -0,0 +1,101 @@
+"""Денормализованные счётчики постов: всего, по автору и по группе.
+
+Счётчики обновляются сигналами при сохранении и удалении `Post`.
+Отсутствующий счётчик считается честным COUNT(*) при первом чтении,
+поэтому записи, созданные в обход сигналов (`bulk_create`, `update`),
+дают лишь приблизительные значения до запуска `reconcile_counters`.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Post, PostCounter
+
+TOTAL = 'posts'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def group_key(group_id):
+    return f'group:{group_id}'
+
+
+def keys_for(post):
+    keys = [TOTAL, author_key(post.author_id)]
+    if post.group_id:
+        keys.append(group_key(post.group_id))
+    return keys
+
+
+def _count(key):
+    kind, _, pk = key.partition(':')
+    posts = Post.objects.all()
+    if kind == 'author':
+        posts = posts.filter(author_id=pk)
+    elif kind == 'group':
+        posts = posts.filter(group_id=pk)
+    return posts.count()
+
+
+def get(key):
+    value = PostCounter.objects.filter(
+        key=key
+    ).values_list('value', flat=True).first()
+    if value is None:
+        counter, _ = PostCounter.objects.get_or_create(
+            key=key, defaults={'value': _count(key)}
+        )
+        value = counter.value
+    return max(value, 0)
+
+
+def total():
+    return get(TOTAL)
+
+
+def for_author(author_id):
+    return get(author_key(author_id))
+
+
+def for_group(group_id):
+    return get(group_key(group_id))
+
+
+def change(keys, delta):
+    """Сдвигает уже заведённые счётчики; новые посчитает `get`."""
+    PostCounter.objects.filter(key__in=keys).update(value=F('value') + delta)
+
+
+def discard(key):
+    PostCounter.objects.filter(key=key).delete()
+
+
+def reconcile():
+    """Пересчитывает все счётчики, возвращает число исправленных."""
+    expected = {TOTAL: Post.objects.count()}
+    posts = Post.objects.order_by()
+    expected.update(
+        (author_key(author_id), count) for author_id, count
+        in posts.values_list('author').annotate(Count('pk'))
+    )
+    expected.update(
+        (group_key(group_id), count) for group_id, count
+        in posts.filter(group__isnull=False).values_list(
+            'group').annotate(Count('pk'))
+    )
+    with transaction.atomic():
+        current = dict(PostCounter.objects.values_list('key', 'value'))
+        stale = current.keys() - expected.keys()
+        PostCounter.objects.filter(key__in=stale).delete()
+        PostCounter.objects.bulk_create(
+            PostCounter(key=key, value=value)
+            for key, value in expected.items() if key not in current
+        )
+        drifted = [
+            key for key, value in expected.items()
+            if key in current and current[key] != value
+        ]
+        for key in drifted:
+            PostCounter.objects.filter(key=key).update(value=expected[key])
+    return len(stale) + len(expected.keys() - current.keys()) + len(drifted)
@@ -0,0 +1,31 @@
+"""Производные данные, которые сигналы ведут построчно.
+
+`bulk_create` сигналов не вызывает, поэтому после массовой вставки
+ленты подписок, счётчики, ссылки на картинки и поисковый индекс
+достраиваются здесь целиком.
+"""
+from django.db.models import Count
+
+from core.models import StoredFile
+
+from . import counters, fanout, search
+from .models import Post
+
+
+def reference_images():
+    for name, references in Post.objects.exclude(image='').values_list(
+        'image'
+    ).annotate(Count('pk')).order_by():
+        StoredFile.objects.filter(name=name).update(references=references)
+
+
+def rebuild(progress=None):
+    """Перестраивает всё производное; возвращает число записей лент."""
+    progress = progress or (lambda kind, done, total: None)
+    feed = fanout.backfill()
+    progress('feed', feed, feed)
+    counters.reconcile()
+    reference_images()
+    indexed = search.rebuild()
+    progress('search', indexed, indexed)
+    return feed
@@ -0,0 +1,71 @@
+"""Лента подписок, материализованная при записи (fan-out on write).
+
+Каждый пост раскладывается по строкам `FeedEntry` всех подписчиков
+автора, поэтому страница подписок - это чтение диапазона по индексу
+`(user, pub_date)` без соединения с `Follow`.
+"""
+from itertools import islice
+
+from django.db import transaction
+
+from .models import FeedEntry, Follow, Post
+
+BATCH_SIZE = 1000
+
+
+def _bulk_create(entries, batch_size=BATCH_SIZE):
+    created = 0
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return created
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        created += len(batch)
+
+
+def push_post(post):
+    """Добавляет новый пост в ленты подписчиков его автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    return _bulk_create(
+        FeedEntry(user_id=user_id, post=post, author_id=post.author_id,
+                  pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту пользователя все посты нового автора."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    return _bulk_create(
+        FeedEntry(user_id=user_id, post_id=post_id, author_id=author_id,
+                  pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def backfill(batch_size=BATCH_SIZE):
+    """Перестраивает все ленты по текущим подпискам."""
+    rows = Post.objects.filter(
+        author__following__isnull=False
+    ).values_list(
+        'author__following__user_id', 'pk', 'author_id', 'pub_date'
+    ).order_by()
+    with transaction.atomic():
+        FeedEntry.objects.all().delete()
+        return _bulk_create(
+            (
+                FeedEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+                for user_id, post_id, author_id, pub_date in rows.iterator()
+            ),
+            batch_size,
+        )
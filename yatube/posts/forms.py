@@ -1,9 +1,11 @@
 from django import forms
 
+from core.uploads import UploadErrorsFormMixin
+
 from .models import Comment, Post
 
 
-class PostForm(forms.ModelForm):
+class PostForm(UploadErrorsFormMixin, forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import fanout
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает ленты подписок по существующим подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=fanout.BATCH_SIZE,
+            help='Сколько записей вставлять за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        created = fanout.backfill(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Записей в лентах подписок: {created}')
+        )
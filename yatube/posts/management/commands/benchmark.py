@@ -0,0 +1,137 @@
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmark, seeding, thumbnails
+
+COLUMNS = ('requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'queries',
+           'rps')
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер страниц постов на синтетических данных. База, '
+        'медиафайлы и кэш создаются во временном каталоге и удаляются '
+        'после замера. Замерять стоит с YATUBE_ENV=prod.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument('--images', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--views', nargs='+', choices=benchmark.VIEWS,
+            default=list(benchmark.VIEWS))
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Сколько запросов к каждой странице.')
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Сколько потоков шлют запросы одновременно.')
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Сколько запросов к странице не учитывать.')
+        parser.add_argument(
+            '--baseline', default=os.path.join(
+                settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+            help='Файл замера, с которым сравнивать.')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Сохранить замер как новый образец.')
+        parser.add_argument(
+            '--tolerance', type=float, default=benchmark.TOLERANCE,
+            help='Допустимый рост p95, доля.')
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING(
+                'DEBUG включён: Django хранит каждый SQL-запрос, '
+                'замер будет медленнее боевого.'
+            ))
+        # Превышения бюджета запросов видны в отчёте, а не в логе.
+        logging.getLogger('yatube.queries').setLevel(logging.ERROR)
+        with tempfile.TemporaryDirectory() as directory:
+            caches = {
+                'default': {
+                    **settings.CACHES['default'],
+                    'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+                },
+            }
+            # Запросы RequestFactory приходят на хост testserver, а
+            # манифест статики в замере не нужен: collectstatic не
+            # запускался, и {% static %} падал бы на каждой странице.
+            with override_settings(
+                MEDIA_ROOT=os.path.join(directory, 'media'), CACHES=caches,
+                ALLOWED_HOSTS=['testserver'],
+                STATICFILES_STORAGE=(
+                    'django.contrib.staticfiles.storage.StaticFilesStorage'),
+            ):
+                report = self.measure(directory, options)
+        self.print_report(report)
+        failed = [view for view, row in report.items() if row['errors']]
+        if failed:
+            raise CommandError(
+                'Страницы отвечали ошибками: ' + ', '.join(failed))
+        self.check_baseline(report, options)
+
+    def measure(self, directory, options):
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            directory, 'benchmark.sqlite3')
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            counts = seeding.seed(
+                users=options['users'], groups=options['groups'],
+                posts=options['posts'], comments=options['comments'],
+                follows=options['follows'], images=options['images'],
+                seed=options['seed'],
+            )
+            self.stdout.write('Данные: ' + ', '.join(
+                f'{name} {count}' for name, count in counts.items()))
+            return benchmark.run(
+                views=options['views'], requests=options['requests'],
+                concurrency=options['concurrency'],
+                warmup=options['warmup'], seed=options['seed'],
+            )
+        finally:
+            # Миниатюры из очереди пишут во временные базу и каталог.
+            thumbnails.drain()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"view":<14}' + ''.join(f'{name:>10}' for name in COLUMNS))
+        for view, row in report.items():
+            self.stdout.write(
+                f'{view:<14}'
+                + ''.join(f'{row[name]:>10}' for name in COLUMNS))
+
+    def check_baseline(self, report, options):
+        path = options['baseline']
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            benchmark.save_baseline(path, report, {
+                name: options[name] for name in (
+                    'users', 'groups', 'posts', 'comments', 'follows',
+                    'images', 'seed', 'requests', 'concurrency')
+            })
+            self.stdout.write(self.style.SUCCESS(f'Образец сохранён: {path}'))
+            return
+        if not os.path.exists(path):
+            return
+        regressions = benchmark.compare(
+            report, benchmark.load_baseline(path), options['tolerance'])
+        for line in regressions:
+            self.stderr.write(line)
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.utils import COMMENTS_QUANTITY, POSTS_QUANTITY, KeysetPaginator
+from posts.models import Comment, FeedEntry, Post
+
+# Составные индексы, ради которых написана команда.
+INDEXED_MODELS = (Post, Comment)
+
+
+def feeds():
+    """Запросы лент так, как их строят view: (имя, queryset, сортировка)."""
+    return (
+        ('index', Post.objects.select_related('group', 'author'),
+         POSTS_QUANTITY, ('pub_date', 'pk')),
+        ('group_posts', Post.objects.filter(group_id=1)
+         .select_related('author'), POSTS_QUANTITY, ('pub_date', 'pk')),
+        ('profile', Post.objects.filter(author_id=1)
+         .select_related('author', 'group'), POSTS_QUANTITY,
+         ('pub_date', 'pk')),
+        ('follow_index', FeedEntry.objects.filter(user_id=1)
+         .select_related('post__author', 'post__group'), POSTS_QUANTITY,
+         ('pub_date', 'pk')),
+        ('post_detail', Comment.objects.filter(post_id=1)
+         .select_related('author').order_by('created', 'pk'),
+         COMMENTS_QUANTITY, ('created', 'pk')),
+    )
+
+
+def pages(queryset, per_page, ordering):
+    """Первая страница, страница по курсору и последняя страница."""
+    paginator = KeysetPaginator(queryset, per_page, ordering=ordering)
+    cursor = [timezone.now(), 1]
+    return (
+        ('первая', queryset[:per_page]),
+        ('по курсору', paginator._seek(cursor, False)[:per_page + 1]),
+        ('последняя', paginator._seek(None, True)[:per_page + 1]),
+    )
+
+
+def explain_all():
+    return {
+        (name, page): query.explain()
+        for name, queryset, per_page, ordering in feeds()
+        for page, query in pages(queryset, per_page, ordering)
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы запросов лент (EXPLAIN) без составных индексов '
+        'и с ними.'
+    )
+
+    def explain_without_indexes(self):
+        # DDL в SQLite и PostgreSQL транзакционный: индексы удаляются
+        # только на время EXPLAIN и возвращаются откатом.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for model in INDEXED_MODELS:
+                    for index in model._meta.indexes:
+                        cursor.execute(
+                            'DROP INDEX '
+                            + connection.ops.quote_name(index.name)
+                        )
+            plans = explain_all()
+            transaction.set_rollback(True)
+        return plans
+
+    def handle(self, *args, **options):
+        before = self.explain_without_indexes()
+        after = explain_all()
+        for (name, page), plan in after.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}, {page}'))
+            self.stdout.write('  до:')
+            for line in before[name, page].splitlines():
+                self.stdout.write(f'    {line}')
+            self.stdout.write('  после:')
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
@@ -0,0 +1,36 @@
+import gzip
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, пользователей, посты, комментарии и подписки '
+        'в NDJSON. Файл с расширением .gz сжимается, "-" - вывод в stdout.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+            help='Сколько строк читать из базы за раз.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file = self.stdout if path == '-' else _open(path)
+        try:
+            counts = transfer.export(file, options['batch_size'])
+        finally:
+            if path != '-':
+                file.close()
+        # В stdout идут данные, поэтому итог - в stderr.
+        self.stderr.write(self.style.SUCCESS('Выгружено: ' + ', '.join(
+            f'{model} {count}' for model, count in counts.items())))
@@ -0,0 +1,65 @@
+import gzip
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import transfer
+
+# Не чаще, чем раз в столько секунд, пишется прогресс одного вида записей.
+PROGRESS_INTERVAL = 1
+
+
+def _open(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает NDJSON из export_posts одной транзакцией и перестраивает '
+        'ленты подписок, счётчики и поисковый индекс. Файлы картинок '
+        'переносятся отдельно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+            help='Сколько записей вставлять за один запрос.')
+
+    def handle(self, *args, **options):
+        self.started = time.perf_counter()
+        self.reported = {}
+        try:
+            file = _open(options['path'])
+        except OSError as error:
+            raise CommandError(error)
+        try:
+            counts = transfer.load(
+                file, options['batch_size'], progress=self.progress)
+        except (transfer.InvalidRecord, OSError) as error:
+            raise CommandError(f'Загрузка отменена. {error}')
+        except IntegrityError as error:
+            raise CommandError(
+                'Загрузка отменена: ключи постов или комментариев уже '
+                f'заняты либо ссылки ведут в никуда ({error}).')
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: ' + ', '.join(
+                f'{model} {count}' for model, count in counts.items())
+            + f' за {time.perf_counter() - self.started:.1f} с.'
+        ))
+
+    def progress(self, kind, done, total):
+        now = time.perf_counter()
+        if now - self.reported.get(kind, 0) < PROGRESS_INTERVAL:
+            return
+        self.reported[kind] = now
+        self.stdout.write(f'{kind}: {done} ({now - self.started:.1f} с)')
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import seeding
+
+# Не чаще, чем раз в столько секунд, пишется прогресс одного вида строк.
+PROGRESS_INTERVAL = 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями, подписками и картинками. Одинаковый --seed даёт '
+        'одинаковые данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--images', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size', type=int, default=seeding.BATCH_SIZE,
+            help='Сколько строк вставлять в одной транзакции.')
+
+    def handle(self, *args, **options):
+        volumes = {
+            name: options[name] for name in (
+                'users', 'groups', 'posts', 'comments', 'follows', 'images')
+        }
+        if any(value < 0 for value in volumes.values()):
+            raise CommandError('Объёмы не могут быть отрицательными.')
+        if not volumes['users'] and (
+                volumes['posts'] or volumes['follows']):
+            raise CommandError('Постам и подпискам нужны пользователи.')
+        self.started = time.perf_counter()
+        self.reported = {}
+        counts = seeding.seed(
+            **volumes, seed=options['seed'],
+            batch_size=options['batch_size'], progress=self.progress,
+        )
+        elapsed = time.perf_counter() - self.started
+        rows = sum(counts[name] for name in (
+            'users', 'groups', 'posts', 'comments', 'follows', 'feed'))
+        self.stdout.write(self.style.SUCCESS(
+            'Создано: ' + ', '.join(
+                f'{name} {count}' for name, count in counts.items())
+            + f'. {rows} строк за {elapsed:.1f} с, '
+            f'{rows / elapsed * 60:.0f} строк в минуту.'
+        ))
+
+    def progress(self, kind, done, total):
+        now = time.perf_counter()
+        if done < total and now - self.reported.get(kind, 0) < (
+                PROGRESS_INTERVAL):
+            return
+        self.reported[kind] = now
+        self.stdout.write(
+            f'{kind}: {done}/{total} ({now - self.started:.1f} с)')
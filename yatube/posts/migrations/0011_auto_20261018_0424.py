@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:24
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_imagevariant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.DeduplicatingStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
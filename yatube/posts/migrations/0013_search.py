@@ -0,0 +1,37 @@
+from django.db import migrations
+
+CREATE_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5('
+    "post_id UNINDEXED, text, tokenize='unicode61 remove_diacritics 2')"
+)
+FILL_TABLE = (
+    'INSERT INTO posts_search (rowid, post_id, text) '
+    'SELECT id * 2, id, text FROM posts_post',
+    'INSERT INTO posts_search (rowid, post_id, text) '
+    'SELECT id * 2 + 1, post_id, text FROM posts_comment',
+)
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    for statement in FILL_TABLE:
+        schema_editor.execute(statement)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_auto_20261018_0426'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
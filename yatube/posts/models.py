@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import DeduplicatingStorage
+
 User = get_user_model()
 
 CONSTANT_SYMBOLS = 15
@@ -30,6 +32,7 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=DeduplicatingStorage(),
         blank=True
     )
 
@@ -37,6 +40,16 @@ class Post(models.Model):
         verbose_name = ('Посты')
         verbose_name_plural = ('Посты')
         ordering = ['pub_date']
+        indexes = [
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:CONSTANT_SYMBOLS]
@@ -75,6 +88,14 @@ class Comment(models.Model):
         db_index=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -101,3 +122,80 @@ class Follow(models.Model):
                 name='follow_not_author'
             )
         ]
+
+
+class PostCounter(models.Model):
+    key = models.CharField(verbose_name='Ключ', max_length=64, unique=True)
+    value = models.IntegerField(verbose_name='Значение', default=0)
+
+    class Meta:
+        verbose_name = ('Счётчик постов')
+        verbose_name_plural = ('Счётчики постов')
+
+    def __str__(self):
+        return f'{self.key}={self.value}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='feed',
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = ('Лента подписок')
+        verbose_name_plural = ('Ленты подписок')
+        ordering = ['pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='feed_unique_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date'],
+                name='feed_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class ImageVariant(models.Model):
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+    )
+    image = models.ImageField(
+        'Вариант картинки',
+        upload_to='posts/variants/',
+    )
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    content_type = models.CharField(verbose_name='Тип', max_length=20)
+
+    class Meta:
+        verbose_name = ('Вариант картинки')
+        verbose_name_plural = ('Варианты картинок')
+        ordering = ['width']
+
+    def __str__(self):
+        return self.image.name
@@ -0,0 +1,172 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+Тексты постов и комментариев лежат в виртуальной таблице `posts_search`
+с обратным индексом; сигналы обновляют её при каждом сохранении или
+удалении, а `rebuild_search_index` строит заново. rowid строки кодирует
+объект (`id * 2` у поста, `id * 2 + 1` у комментария), поэтому
+обновление одной записи - поиск по первичному ключу, а не перебор.
+Результаты - посты, найденные по своему тексту или по комментариям,
+в порядке релевантности (bm25).
+
+На других СУБД таблицы нет: поиск ищет подстроку, как `search_fields`.
+"""
+import re
+from itertools import islice
+
+from django.db import connection
+
+from .models import Comment, Post
+
+TABLE = 'posts_search'
+POST, COMMENT = 0, 1
+WORD = re.compile(r'\w+')
+BATCH_SIZE = 1000
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Запрос пользователя как выражение MATCH: все слова, по префиксу.
+
+    Синтаксис FTS5 пользователю не доступен: каждое слово берётся
+    в кавычки, поэтому кавычки и операторы в запросе ничего не ломают.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def _execute(sql, params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _replace(rowid, post_id, text):
+    _execute(f'DELETE FROM {TABLE} WHERE rowid = %s', (rowid,))
+    _execute(
+        f'INSERT INTO {TABLE} (rowid, post_id, text) VALUES (%s, %s, %s)',
+        (rowid, post_id, text),
+    )
+
+
+def index_post(post):
+    if enabled():
+        _replace(post.pk * 2 + POST, post.pk, post.text)
+
+
+def index_comment(comment):
+    if enabled():
+        _replace(comment.pk * 2 + COMMENT, comment.post_id, comment.text)
+
+
+def remove_post(post_id):
+    if enabled():
+        _execute(
+            f'DELETE FROM {TABLE} WHERE rowid = %s', (post_id * 2 + POST,)
+        )
+
+
+def remove_comment(comment_id):
+    if enabled():
+        _execute(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            (comment_id * 2 + COMMENT,),
+        )
+
+
+def _rows():
+    for pk, text in Post.objects.values_list('pk', 'text').iterator():
+        yield pk * 2 + POST, pk, text
+    for pk, post_id, text in Comment.objects.values_list(
+            'pk', 'post_id', 'text').iterator():
+        yield pk * 2 + COMMENT, post_id, text
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Строит индекс заново по всем постам и комментариям."""
+    if not enabled():
+        return 0
+    _execute(f'DELETE FROM {TABLE}')
+    rows, count = _rows(), 0
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return count
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, post_id, text) '
+                'VALUES (%s, %s, %s)',
+                batch,
+            )
+            count += len(batch)
+
+
+def filter_matching(queryset, kind, query):
+    """Посты или комментарии из `queryset`, подходящие под запрос.
+
+    Совпадения отбираются подзапросом к индексу в той же SQL-команде:
+    список id в Python не собирается и в лимит переменных SQLite
+    не упирается.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    opts = queryset.model._meta
+    column = '{}.{}'.format(
+        connection.ops.quote_name(opts.db_table),
+        connection.ops.quote_name(opts.pk.column),
+    )
+    return queryset.extra(
+        where=[
+            f'{column} IN (SELECT rowid / 2 FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s AND rowid %% 2 = %s)'
+        ],
+        params=[expression, kind],
+    )
+
+
+class SearchResults:
+    """Найденные посты для Paginator: `count()` и срезы в порядке rank."""
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+        self.queryset = Post.objects.select_related(
+            'author', 'group').prefetch_related('image_variants')
+        if not enabled():
+            self.queryset = self.queryset.filter(
+                text__icontains=query).order_by('-pub_date')
+
+    def count(self):
+        if not self.expression:
+            return 0
+        if not enabled():
+            return self.queryset.count()
+        [(count,)] = _execute(
+            f'SELECT COUNT(DISTINCT post_id) FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s',
+            (self.expression,),
+        )
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('SearchResults поддерживает только срезы.')
+        if not self.expression:
+            return []
+        if not enabled():
+            return list(self.queryset[index])
+        offset = index.start or 0
+        rows = _execute(
+            'SELECT post_id, MIN(rank) AS best FROM ('
+            f' SELECT post_id, rank FROM {TABLE} WHERE {TABLE} MATCH %s'
+            ') GROUP BY post_id ORDER BY best, post_id LIMIT %s OFFSET %s',
+            (self.expression, index.stop - offset, offset),
+        )
+        posts = self.queryset.in_bulk([post_id for post_id, _ in rows])
+        return [
+            posts[post_id] for post_id, _ in rows if post_id in posts
+        ]
@@ -0,0 +1,197 @@
+"""Синтетические данные для нагрузочных замеров.
+
+Строки вставляются через `bulk_create` пачками, каждая в своей
+транзакции, поэтому память не растёт с объёмом, а сигналы не
+срабатывают: ленты подписок, счётчики, поисковый индекс и ссылки на
+картинки достраиваются после вставки через `derived.rebuild` - теми же
+функциями, что и команды `backfill_feed`, `reconcile_counters` и
+`rebuild_search_index`. В конце сбрасываются теги кэша, которые
+задевают новые строки, как после `import_posts`.
+
+Новые строки ссылаются только на новые строки: первичные ключи одной
+вставки идут подряд (AUTOINCREMENT, один пишущий процесс), поэтому
+ссылка выбирается числом из диапазона, а не из списка ключей в памяти.
+Тексты собираются из заранее сгенерированных Faker предложений - сам
+Faker слишком медленный, чтобы звать его на каждую строку.
+Одинаковый `seed` даёт одинаковые данные.
+"""
+import random
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Max, Min
+from faker import Faker
+from PIL import Image
+
+from core.cache import bump
+
+from . import caching, derived
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+PASSWORD = 'benchmark'
+TEXT_POOL = 2000
+SENTENCES_PER_POST = 5
+IMAGE_SHARE = 0.3
+GROUPLESS_SHARE = 0.2
+
+
+def _image(rng):
+    image = Image.new('RGB', (1280, 720), tuple(
+        rng.randrange(256) for _ in range(3)))
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue())
+
+
+def _save_images(count, rng):
+    storage = Post._meta.get_field('image').storage
+    return [
+        storage.save(f'posts/seed_{number}.png', _image(rng))
+        for number in range(count)
+    ]
+
+
+def _last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def _tags(users, groups, posts):
+    """Теги кэша страниц, на которых появляются новые строки."""
+    tags = {caching.INDEX}
+    for pk, username in User.objects.filter(
+            pk__range=users).values_list('pk', 'username').iterator():
+        tags.add(caching.author_tag(username))
+        tags.add(caching.follower_tag(pk))
+    tags.update(
+        caching.group_tag(slug) for slug in Group.objects.filter(
+            pk__range=groups).values_list('slug', flat=True).iterator())
+    shard = caching.SITEMAP_SHARD
+    for section, (first, last) in (
+            ('profiles', users), ('groups', groups), ('posts', posts)):
+        tags.update(
+            caching.sitemap_tag(section, pk)
+            for pk in range(first - first % shard, last + 1, shard))
+    return tags
+
+
+class Seeder:
+    """Генератор строк; `progress(вид, готово, всего)` после каждой пачки."""
+
+    def __init__(self, seed=0, batch_size=BATCH_SIZE, progress=None):
+        self.rng = random.Random(seed)
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.sentences = [fake.sentence() for _ in range(TEXT_POOL)]
+        self.first_names = [fake.first_name() for _ in range(TEXT_POOL)]
+        self.last_names = [fake.last_name() for _ in range(TEXT_POOL)]
+        self.titles = [fake.catch_phrase()[:200] for _ in range(TEXT_POOL)]
+        self.batch_size = batch_size
+        self.progress = progress or (lambda kind, done, total: None)
+
+    def _insert(self, kind, model, total, build, **options):
+        """Вставляет `total` строк пачками; возвращает диапазон их ключей."""
+        before = _last_pk(model)
+        done = 0
+        while done < total:
+            size = min(self.batch_size, total - done)
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    (build(done + number) for number in range(size)),
+                    **options,
+                )
+            done += size
+            self.progress(kind, done, total)
+        # AUTOINCREMENT не выдаёт ключи повторно: всё, что больше
+        # прежнего максимума, вставлено сейчас.
+        inserted = model.objects.filter(pk__gt=before).aggregate(
+            first=Min('pk'), last=Max('pk'))
+        if inserted['first'] is None:
+            return before + 1, before
+        return inserted['first'], inserted['last']
+
+    def users(self, total):
+        password = make_password(PASSWORD)
+        first = _last_pk(User) + 1
+        return self._insert('users', User, total, lambda number: User(
+            username=f'seed{first + number}',
+            first_name=self.rng.choice(self.first_names),
+            last_name=self.rng.choice(self.last_names),
+            password=password,
+        ))
+
+    def groups(self, total):
+        first = _last_pk(Group) + 1
+        return self._insert('groups', Group, total, lambda number: Group(
+            title=self.rng.choice(self.titles),
+            slug=f'seed-{first + number}',
+            description=self.rng.choice(self.sentences),
+        ))
+
+    def posts(self, total, users, groups, images):
+        def build(number):
+            group_id = None
+            if groups[1] >= groups[0] and self.rng.random() >= (
+                    GROUPLESS_SHARE):
+                group_id = self.rng.randint(*groups)
+            image = ''
+            if images and self.rng.random() < IMAGE_SHARE:
+                image = self.rng.choice(images)
+            return Post(
+                text=' '.join(self.rng.choices(
+                    self.sentences, k=SENTENCES_PER_POST)),
+                author_id=self.rng.randint(*users),
+                group_id=group_id,
+                image=image,
+            )
+        return self._insert('posts', Post, total, build)
+
+    def comments(self, total, users, posts):
+        return self._insert('comments', Comment, total, lambda number: (
+            Comment(
+                text=self.rng.choice(self.sentences),
+                author_id=self.rng.randint(*users),
+                post_id=self.rng.randint(*posts),
+            )
+        ))
+
+    def follows(self, total, users):
+        """Подписки без повторов: j-я подписка пользователя - на автора
+        со сдвигом `1 + (старт + j) % (n - 1)`, где старт у каждого свой.
+        """
+        count = users[1] - users[0] + 1
+        if count < 2:
+            return users[0], users[0] - 1
+        total = min(total, count * (count - 1))
+        starts = [self.rng.randrange(count - 1) for _ in range(count)]
+
+        def build(number):
+            user, step = number % count, number // count
+            author = (user + 1 + (starts[user] + step) % (count - 1)) % count
+            return Follow(user_id=users[0] + user,
+                          author_id=users[0] + author)
+        return self._insert(
+            'follows', Follow, total, build, ignore_conflicts=True)
+
+
+def seed(users=100, groups=10, posts=1000, comments=3000, follows=1000,
+         images=10, seed=0, batch_size=BATCH_SIZE, progress=None):
+    """Создаёт данные и достраивает производные; возвращает число строк."""
+    seeder = Seeder(seed, batch_size, progress)
+    image_names = _save_images(images, seeder.rng)
+    user_ids = seeder.users(users)
+    group_ids = seeder.groups(groups)
+    post_ids = seeder.posts(posts, user_ids, group_ids, image_names)
+    seeder.comments(comments if posts else 0, user_ids, post_ids)
+    seeder.follows(follows, user_ids)
+    feed = derived.rebuild(seeder.progress)
+    bump(*_tags(user_ids, group_ids, post_ids))
+    return {
+        'users': users, 'groups': groups, 'posts': posts,
+        'comments': comments if posts else 0,
+        'follows': Follow.objects.filter(
+            user__pk__range=user_ids).count(),
+        'feed': feed, 'images': images,
+    }
@@ -0,0 +1,152 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import storage
+
+from . import caching, counters, fanout, search, thumbnails
+from .models import Comment, Follow, Group, ImageVariant, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_group(sender, instance, **kwargs):
+    instance._previous_group = None
+    if not instance._state.adding:
+        instance._previous_group = Group.objects.filter(
+            posts__pk=instance.pk
+        ).first()
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_image(sender, instance, **kwargs):
+    instance._previous_image = ''
+    if not instance._state.adding:
+        instance._previous_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first() or ''
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change(counters.keys_for(instance), 1)
+        return
+    previous = instance._previous_group
+    previous_id = previous.pk if previous else None
+    if previous_id != instance.group_id:
+        if previous_id:
+            counters.change([counters.group_key(previous_id)], -1)
+        if instance.group_id:
+            counters.change([counters.group_key(instance.group_id)], 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change(counters.keys_for(instance), -1)
+
+
+@receiver(post_delete, sender=Group)
+def discard_group_counter(sender, instance, **kwargs):
+    counters.discard(counters.group_key(instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        fanout.push_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        fanout.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_feed(sender, instance, **kwargs):
+    fanout.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, **kwargs):
+    caching.invalidate_post(instance, instance._previous_group)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    caching.invalidate_post(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields, **kwargs):
+    # Вход пользователя меняет только last_login, которого нет на страницах.
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    caching.invalidate_author(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    caching.invalidate_group(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    caching.invalidate_comment(instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    caching.invalidate_follow(instance)
+
+
+@receiver(post_save, sender=Post)
+def reference_saved_image(sender, instance, **kwargs):
+    if instance.image.name == instance._previous_image:
+        return
+    if instance.image:
+        storage.acquire(instance.image.name)
+    if instance._previous_image:
+        storage.release(instance._previous_image, instance.image.storage)
+
+
+@receiver(post_save, sender=Post)
+def enqueue_thumbnail(sender, instance, **kwargs):
+    # Миниатюра и варианты новой картинки строятся в фоне после коммита.
+    if instance.image and instance.image.name != instance._previous_image:
+        thumbnails.enqueue(instance)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        storage.release(instance.image.name, instance.image.storage)
+
+
+@receiver(post_delete, sender=ImageVariant)
+def delete_variant_file(sender, instance, **kwargs):
+    # Одинаковые картинки разных постов делят файлы вариантов.
+    if not ImageVariant.objects.filter(image=instance.image.name).exists():
+        instance.image.delete(save=False)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    search.remove_comment(instance.pk)
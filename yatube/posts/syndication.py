@@ -0,0 +1,269 @@
+"""Atom-ленты групп и авторов и карта сайта для поисковиков.
+
+Ответ собирается по кускам из `.iterator()` и уходит клиенту потоком,
+сразу сжатый gzip. Сжатый результат целиком ложится в кэш вместе с
+поколениями своих тегов: пока теги не сброшены, ответ отдаётся из
+кэша без обращений к базе. Карта сайта разрезана на части по
+диапазонам ключей (`caching.SITEMAP_SHARD`), поэтому изменение поста
+пересобирает только его часть, а не всю карту.
+"""
+import gzip
+import hashlib
+import zlib
+from datetime import datetime
+from itertools import chain
+from xml.sax.saxutils import escape, quoteattr
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.text import Truncator
+
+from core import compression
+from core.cache import generations
+
+from . import caching
+from .models import Group, Post, User
+
+FEED_SIZE = 50
+CHUNK_SIZE = 500
+TITLE_LENGTH = 60
+SHARD_TIMEOUT = 60 * 60 * 24
+SHARD_KEY = 'syndication:{}'
+COMPRESS_LEVEL = 6
+# Смещение 16 к размеру окна zlib даёт заголовок и хвост формата gzip.
+GZIP_WBITS = zlib.MAX_WBITS | 16
+ATOM = 'application/atom+xml; charset=utf-8'
+XML = 'application/xml; charset=utf-8'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _stream(chunks, compressed, key=None, version=None):
+    """Кодирует и сжимает куски на лету; сжатый итог кладёт в кэш."""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    parts = []
+    for chunk in chunks:
+        data = chunk.encode()
+        part = compressor.compress(data)
+        parts.append(part)
+        if compressed:
+            data = part
+        if data:
+            yield data
+    parts.append(compressor.flush())
+    if compressed:
+        yield parts[-1]
+    if key is not None:
+        cache.set(key, (version, b''.join(parts)), SHARD_TIMEOUT)
+
+
+def _encoded(response, compressed):
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def shard_response(request, tags, render, content_type):
+    """Ответ из готовой сжатой части или потоком из `render()`.
+
+    `render` вызывается только без актуальной части в кэше и должен
+    сразу проверить, что объект есть (404), а куски отдавать лениво.
+    Адреса внутри абсолютные, поэтому часть хранится под полным адресом.
+    """
+    compressed = compression.accepts(request, 'gzip')
+    key = SHARD_KEY.format(hashlib.md5(
+        request.build_absolute_uri(request.path).encode()).hexdigest())
+    version = generations(tags)
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version:
+        body = entry[1] if compressed else gzip.decompress(entry[1])
+        return _encoded(
+            HttpResponse(body, content_type=content_type), compressed)
+    return _encoded(StreamingHttpResponse(
+        _stream(render(), compressed, key, version),
+        content_type=content_type,
+    ), compressed)
+
+
+def stream_response(request, chunks, content_type):
+    """Потоковый ответ без кэша - для маленьких дешёвых документов."""
+    compressed = compression.accepts(request, 'gzip')
+    return _encoded(StreamingHttpResponse(
+        _stream(chunks, compressed), content_type=content_type), compressed)
+
+
+def _date(value):
+    return value.isoformat()
+
+
+def _author_name(row):
+    name = f'{row["author__first_name"]} {row["author__last_name"]}'
+    return name.strip() or row['author__username']
+
+
+def _atom(request, title, page_url, posts):
+    absolute = request.build_absolute_uri
+    rows = posts.values(
+        'pk', 'text', 'pub_date', 'author__username',
+        'author__first_name', 'author__last_name',
+    ).order_by('-pub_date', '-pk')[:FEED_SIZE].iterator(
+        chunk_size=CHUNK_SIZE)
+    # Дата ленты - дата самого нового поста, он идёт первым.
+    first = next(rows, None)
+    updated = first['pub_date'] if first else timezone.now()
+
+    def chunks():
+        yield (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom">'
+            f'<title>{escape(title)}</title>'
+            f'<id>{escape(absolute(page_url))}</id>'
+            f'<link rel="alternate" href={quoteattr(absolute(page_url))}/>'
+            f'<link rel="self" href={quoteattr(absolute(request.path))}/>'
+            f'<updated>{_date(updated)}</updated>'
+        )
+        if first is None:
+            yield '</feed>\n'
+            return
+        for row in chain((first,), rows):
+            url = absolute(reverse('posts:post_detail', args=[row['pk']]))
+            profile = absolute(reverse(
+                'posts:profile', args=[row['author__username']]))
+            yield (
+                '<entry>'
+                f'<title>{escape(Truncator(row["text"]).chars(TITLE_LENGTH))}'
+                '</title>'
+                f'<link rel="alternate" href={quoteattr(url)}/>'
+                f'<id>{escape(url)}</id>'
+                f'<published>{_date(row["pub_date"])}</published>'
+                f'<updated>{_date(row["pub_date"])}</updated>'
+                f'<author><name>{escape(_author_name(row))}</name>'
+                f'<uri>{escape(profile)}</uri></author>'
+                f'<content type="text">{escape(row["text"])}</content>'
+                '</entry>'
+            )
+        yield '</feed>\n'
+    return chunks()
+
+
+def group_feed(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _atom(
+        request, group.title,
+        reverse('posts:group_list', args=[slug]), group.posts.all(),
+    )
+
+
+def profile_feed(request, username):
+    author = get_object_or_404(User, username=username)
+    return _atom(
+        request, author.get_full_name() or author.username,
+        reverse('posts:profile', args=[username]), author.posts.all(),
+    )
+
+
+def _post_urls(start, stop):
+    for pk, pub_date in Post.objects.filter(
+        pk__gte=start, pk__lt=stop
+    ).values_list('pk', 'pub_date').order_by('pk').iterator(
+            chunk_size=CHUNK_SIZE):
+        yield reverse('posts:post_detail', args=[pk]), pub_date
+
+
+def _group_urls(start, stop):
+    for slug, lastmod in Group.objects.filter(
+        pk__gte=start, pk__lt=stop
+    ).annotate(lastmod=Max('posts__pub_date')).values_list(
+        'slug', 'lastmod'
+    ).order_by('pk').iterator(chunk_size=CHUNK_SIZE):
+        yield reverse('posts:group_list', args=[slug]), lastmod
+
+
+def _profile_urls(start, stop):
+    # В карту попадают только авторы: пустые профили поисковику не нужны.
+    for username, lastmod in User.objects.filter(
+        pk__gte=start, pk__lt=stop
+    ).annotate(lastmod=Max('posts__pub_date')).filter(
+        lastmod__isnull=False
+    ).values_list('username', 'lastmod').order_by('pk').iterator(
+            chunk_size=CHUNK_SIZE):
+        yield reverse('posts:profile', args=[username]), lastmod
+
+
+SECTIONS = {
+    'posts': (Post, _post_urls),
+    'groups': (Group, _group_urls),
+    'profiles': (User, _profile_urls),
+}
+
+
+def _shards(model):
+    last = model.objects.aggregate(last=Max('pk'))['last']
+    return 0 if last is None else last // caching.SITEMAP_SHARD + 1
+
+
+def sitemap_tags(section, number):
+    return (caching.sitemap_tag(section, number * caching.SITEMAP_SHARD),)
+
+
+def shard_exists(request, section, number):
+    return section in SECTIONS and number < _shards(SECTIONS[section][0])
+
+
+def sitemap(request, section, number):
+    """Часть карты сайта: адреса объектов с ключами из одного диапазона.
+
+    Номер части проверяет `shard_exists` до заведения её тега; адреса
+    выбираются одним запросом уже во время отдачи потока.
+    """
+    if section not in SECTIONS:
+        raise Http404
+    _, urls = SECTIONS[section]
+    start = number * caching.SITEMAP_SHARD
+    absolute = request.build_absolute_uri
+
+    def chunks():
+        yield (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            f'<urlset xmlns="{SITEMAP_NS}">'
+        )
+        for url, lastmod in urls(start, start + caching.SITEMAP_SHARD):
+            entry = f'<url><loc>{escape(absolute(url))}</loc>'
+            if lastmod is not None:
+                entry += f'<lastmod>{_date(lastmod)}</lastmod>'
+            yield entry + '</url>'
+        yield '</urlset>\n'
+    return chunks()
+
+
+def sitemap_index(request):
+    """Список частей карты; дата части - время сброса её тега."""
+    shards = [
+        (section, number)
+        for section, (model, _) in SECTIONS.items()
+        for number in range(_shards(model))
+    ]
+    changed = generations([
+        sitemap_tags(section, number)[0] for section, number in shards])
+    absolute = request.build_absolute_uri
+
+    def chunks():
+        yield (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            f'<sitemapindex xmlns="{SITEMAP_NS}">'
+        )
+        for (section, number), generation in zip(shards, changed):
+            url = absolute(reverse('posts:sitemap', args=[section, number]))
+            lastmod = datetime.fromtimestamp(
+                generation / 10 ** 9, tz=timezone.utc)
+            yield (
+                f'<sitemap><loc>{escape(url)}</loc>'
+                f'<lastmod>{_date(lastmod)}</lastmod></sitemap>'
+            )
+        yield '</sitemapindex>\n'
+    return chunks()
@@ -0,0 +1,27 @@
+from django import template
+
+from posts import caching
+
+register = template.Library()
+
+PREFETCHED = 'prefetched_card_versions'
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_card_versions(context, posts):
+    """Загружает версии карточек всех постов страницы одним запросом.
+
+    Ставится перед циклом по постам, как и `prefetch_thumbnails`.
+    """
+    context[PREFETCHED] = caching.card_versions(posts)
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+def card_version(context, post):
+    """Версия карточки поста: меняется при изменении поста, автора
+    или группы."""
+    prefetched = context.get(PREFETCHED, {})
+    if post.pk in prefetched:
+        return prefetched[post.pk]
+    return caching.card_versions([post])[post.pk]
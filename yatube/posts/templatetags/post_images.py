@@ -0,0 +1,59 @@
+from django import template
+
+from posts import thumbnails, variants
+
+register = template.Library()
+
+PREFETCHED = 'prefetched_thumbnails'
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_thumbnails(context, posts):
+    """Загружает миниатюры всех постов страницы одним обращением.
+
+    Ставится перед циклом по постам; `post_thumbnail` внутри цикла
+    берёт миниатюру из загруженных, не обращаясь к хранилищу. Загрузка
+    откладывается до первой карточки, которой нет в кэше фрагментов:
+    если кэшированы все, хранилище не читается вовсе.
+    """
+    # Словарь, а не значение в контексте: `include` карточки работает
+    # со своим уровнем контекста, и загруженное иначе терялось бы.
+    context[PREFETCHED] = {'posts': list(posts), 'ready': None}
+    return ''
+
+
+def _prefetched(context):
+    prefetched = context.get(PREFETCHED)
+    if prefetched is None:
+        return {}
+    if prefetched['ready'] is None:
+        prefetched['ready'] = thumbnails.ready_thumbnails(
+            post.image for post in prefetched['posts']
+        )
+    return prefetched['ready']
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, post):
+    """Готовая миниатюра картинки поста или None.
+
+    Миниатюра при показе не строится: если её ещё нет, задача ставится
+    в очередь, а шаблон выводит заглушку.
+    """
+    if not post.image:
+        return None
+    prefetched = _prefetched(context)
+    if post.image.name in prefetched:
+        thumbnail = prefetched[post.image.name]
+    else:
+        thumbnail = thumbnails.ready_thumbnail(post.image)
+    if thumbnail is None:
+        thumbnails.enqueue(post)
+        thumbnail = thumbnails.ready_thumbnail(post.image)
+    return thumbnail
+
+
+@register.simple_tag
+def post_sources(post):
+    """Пары (тип, srcset) вариантов картинки поста для `<source>`."""
+    return variants.srcsets(post.image_variants.all())
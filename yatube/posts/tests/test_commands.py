@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import TestCase, override_settings
+
+from core.cache import generations, known
+
+from .. import benchmark, caching, counters, seeding
+from ..models import Comment, FeedEntry, Follow, Group, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class ExplainFeedsTest(TestCase):
+    def test_composite_indexes_replace_sorting(self):
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        report = out.getvalue()
+        self.assertIn('USE TEMP B-TREE FOR ORDER BY', report)
+        for index in ('post_group_pub_date_idx', 'post_author_pub_date_idx',
+                      'comment_post_created_idx'):
+            with self.subTest(index=index):
+                self.assertIn(index, report)
+        # Индексы удалялись только внутри откаченной транзакции.
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table)
+        self.assertIn('post_group_pub_date_idx', constraints)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # Как и тестовый клиент: соединение внутри транзакции теста
+        # не должно закрываться между запросами.
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def test_seeded_views_are_measured(self):
+        seeding.seed(users=5, groups=2, posts=30, comments=20, follows=10,
+                     images=1)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(counters.total(), 30)
+        self.assertTrue(FeedEntry.objects.exists())
+        report = benchmark.run(requests=3, concurrency=1, warmup=0)
+        self.assertEqual(set(report), set(benchmark.VIEWS))
+        for view, row in report.items():
+            with self.subTest(view=view):
+                self.assertEqual(row['errors'], 0)
+                self.assertGreater(row['queries'], 0)
+                self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+        self.assertEqual(Post.objects.count(), 33)
+
+    def test_regressions_against_baseline(self):
+        baseline = {'index': {'p95_ms': 10.0, 'queries': 5, 'errors': 0}}
+        report = {'index': {'p95_ms': 11.0, 'queries': 5, 'errors': 0}}
+        self.assertEqual(benchmark.compare(report, baseline), [])
+        report = {'index': {'p95_ms': 13.0, 'queries': 6, 'errors': 3}}
+        self.assertEqual(len(benchmark.compare(report, baseline)), 3)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedYatubeTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self):
+        out = StringIO()
+        call_command(
+            'seed_yatube', users=4, groups=2, posts=25, comments=40,
+            follows=12, images=1, batch_size=10, stdout=out)
+        return out.getvalue()
+
+    def test_rows_and_derived_data_are_created(self):
+        output = self.seed()
+        self.assertIn('posts: 25/25', output)
+        self.assertEqual(Post.objects.count(), 25)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(Follow.objects.count(), 12)
+        self.assertEqual(counters.total(), 25)
+        self.assertEqual(
+            FeedEntry.objects.count(),
+            Post.objects.filter(author__following__isnull=False).count())
+
+    def test_cache_tags_are_bumped(self):
+        cache.clear()
+        tags = [caching.INDEX, caching.sitemap_tag('posts', 0)]
+        before = generations(tags)
+        self.seed()
+        self.assertTrue(all(
+            old != new for old, new in zip(before, generations(tags))))
+        author = Post.objects.first().author
+        self.assertTrue(known([
+            caching.author_tag(author.username),
+            caching.follower_tag(author.pk),
+            caching.group_tag(Group.objects.first().slug),
+        ]))
+
+    def test_same_seed_gives_same_data(self):
+        self.seed()
+        first = list(Post.objects.values_list('text', flat=True))
+        Post.objects.all().delete()
+        self.seed()
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), first)
@@ -1,12 +1,18 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+
+from core.models import StoredFile
 
 from ..models import Comment, Group, Post
 
@@ -77,6 +83,55 @@ class PostCreateFormTests(TestCase):
             ).exists()
         )
 
+    def test_invalid_uploads_are_rejected(self):
+        posts_count = Post.objects.count()
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00'
+            b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+            b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+            b'\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x02\x4c\x01\x00\x3b'
+        )
+        cases = (
+            ('не картинка', b'<?php echo 1; ?>', {}),
+            ('слишком большая', small_gif, {'UPLOAD_IMAGE_MAX_SIZE': 16}),
+            ('слишком много точек', small_gif,
+             {'UPLOAD_IMAGE_MAX_PIXELS': 0}),
+        )
+        for case, content, limits in cases:
+            with self.subTest(case=case), override_settings(**limits):
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={
+                        'text': 'Текст',
+                        'image': SimpleUploadedFile('small.gif', content),
+                    },
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(response.context['form'].has_error('image'))
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    def test_same_image_is_stored_once(self):
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4), 'blue').save(buffer, 'PNG')
+        png = buffer.getvalue()
+        for name in ('first.png', 'second.png'):
+            self.authorized_client.post(reverse('posts:post_create'), {
+                'text': 'Повтор',
+                'image': SimpleUploadedFile(name, png),
+            })
+        first, second = Post.objects.filter(text='Повтор').order_by('pk')
+        name = first.image.name
+        self.assertEqual(name, 'posts/first.png')
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(StoredFile.objects.get(name=name).references, 2)
+        with mock.patch.object(transaction, 'on_commit', lambda run: run()):
+            first.delete()
+            self.assertTrue(second.image.storage.exists(name))
+            second.delete()
+            self.assertFalse(second.image.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
     def test_post_edit_works_correctly(self):
         self.post = Post.objects.create(text='Тестовый текст',
                                         author=self.user,
@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import CONSTANT_SYMBOLS, Group, Post
+from .. import counters
+from ..models import CONSTANT_SYMBOLS, Group, Post, PostCounter
 
 User = get_user_model()
 
@@ -33,3 +37,33 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_object_name = post.text[:CONSTANT_SYMBOLS]
         self.assertEqual(expected_object_name, str(post))
+
+
+class PostCounterTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter')
+        self.group = Group.objects.create(
+            title='Группа', slug='counter', description='Описание')
+        self.other_group = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+        self.post = Post.objects.create(
+            author=self.user, text='Текст', group=self.group)
+
+    def test_counters_follow_post_changes(self):
+        self.assertEqual(counters.for_author(self.user.pk), 1)
+        self.assertEqual(counters.for_group(self.group.pk), 1)
+        Post.objects.create(author=self.user, text='Ещё')
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertEqual(counters.for_author(self.user.pk), 2)
+        self.assertEqual(counters.for_group(self.group.pk), 0)
+        self.assertEqual(counters.for_group(self.other_group.pk), 1)
+        self.post.delete()
+        self.assertEqual(counters.total(), 1)
+        self.assertEqual(counters.for_group(self.other_group.pk), 0)
+
+    def test_reconcile_repairs_drift(self):
+        counters.for_author(self.user.pk)
+        PostCounter.objects.update(value=100)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(counters.for_author(self.user.pk), 1)
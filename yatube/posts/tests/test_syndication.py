@@ -0,0 +1,103 @@
+import gzip
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.cache import known
+
+from .. import caching, syndication
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class SyndicationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='columnist')
+        cls.group = Group.objects.create(
+            title='Колонки', slug='columns', description='Описание')
+        cls.posts = [
+            Post.objects.create(text=f'Колонка {number}', author=cls.author,
+                                group=cls.group)
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def fetch(self, url, **headers):
+        response = self.client.get(url, **headers)
+        body = (b''.join(response.streaming_content) if response.streaming
+                else response.content)
+        if response.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return response, body.decode()
+
+    def test_group_feed_is_gzipped_atom(self):
+        url = reverse('posts:group_feed', args=[self.group.slug])
+        response, body = self.fetch(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response.streaming)
+        entries = ElementTree.fromstring(body).findall(
+            '{http://www.w3.org/2005/Atom}entry')
+        self.assertEqual(len(entries), len(self.posts))
+        self.assertIn('Колонка 4', entries[0].findtext(
+            '{http://www.w3.org/2005/Atom}content'))
+        with self.assertNumQueries(0):
+            response, cached = self.fetch(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.streaming)
+        self.assertEqual(cached, body)
+        response, plain = self.fetch(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(plain, body)
+
+    def test_new_post_reaches_profile_feed(self):
+        url = reverse('posts:profile_feed', args=[self.author.username])
+        self.fetch(url)
+        Post.objects.create(text='Свежая колонка', author=self.author)
+        self.assertIn('Свежая колонка', self.fetch(url)[1])
+
+    def test_unknown_feed_returns_404(self):
+        for url in (reverse('posts:group_feed', args=['missing']),
+                    reverse('posts:sitemap', args=['posts', 1]),
+                    reverse('posts:sitemap', args=['comments', 0])):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(known(caching.group_tags('missing')))
+        self.assertFalse(known(syndication.sitemap_tags('posts', 1)))
+
+    def test_feed_budget_covers_queries_before_stream(self):
+        url = reverse('posts:group_feed', args=[self.group.slug])
+        response = self.client.get(url)
+        self.assertLessEqual(
+            response.query_report['queries'], response.query_report['budget'])
+        # Адреса части карты выбираются уже во время потока.
+        url = reverse('posts:sitemap', args=['posts', 0])
+        with self.assertNumQueries(2):
+            response, body = self.fetch(url)
+        self.assertEqual(response.query_report['queries'], 1)
+        self.assertIn(reverse('posts:post_detail', args=[self.posts[0].pk]),
+                      body)
+
+    @mock.patch.object(caching, 'SITEMAP_SHARD', 2)
+    def test_post_change_rebuilds_only_its_sitemap_shard(self):
+        index = self.fetch(reverse('posts:sitemap_index'))[1]
+        shards = [reverse('posts:sitemap', args=['posts', number])
+                  for number in range(self.posts[-1].pk // 2 + 1)]
+        for shard in shards:
+            self.assertIn(shard, index)
+            self.fetch(shard)
+        post = self.posts[-1]
+        changed = shards[post.pk // 2]
+        post.text = 'Исправленная колонка'
+        post.save()
+        for shard in shards:
+            with self.subTest(shard=shard):
+                response, body = self.fetch(shard)
+                self.assertEqual(response.streaming, shard == changed)
+                self.assertIn('<urlset', body)
@@ -0,0 +1,104 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import counters
+from ..models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', email='lev@example.com')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='transfer', description='Описание')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {number}', author=cls.author,
+                                group=cls.group if number % 2 else None)
+            for number in range(5)
+        ]
+        Post.objects.filter(pk=cls.posts[0].pk).update(
+            pub_date='2001-02-03T04:05:06Z')
+        Comment.objects.create(
+            post=cls.posts[1], author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = f'{self.directory.name}/dump.ndjson.gz'
+        call_command('export_posts', self.path, batch_size=2,
+                     stderr=StringIO())
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author__username', 'group__slug')),
+            list(Comment.objects.values_list(
+                'pk', 'post_id', 'author__username', 'text', 'created')),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        )
+
+    def test_export_and_import_restore_content(self):
+        before = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        out = StringIO()
+        call_command('import_posts', self.path, batch_size=2, stdout=out)
+        self.assertIn('post 5', out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+        restored = User.objects.get(username='writer')
+        self.assertEqual(restored.email, 'lev@example.com')
+        self.assertFalse(restored.has_usable_password())
+        self.assertEqual(counters.total(), 5)
+        self.assertEqual(FeedEntry.objects.count(), 5)
+
+    def test_import_into_filled_database_is_rolled_back(self):
+        before = self.snapshot()
+        with self.assertRaisesMessage(CommandError, 'Загрузка отменена'):
+            call_command('import_posts', self.path, stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_invalid_record_names_its_line(self):
+        path = f'{self.directory.name}/broken.ndjson'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('{"model": "group", "slug": "new", "title": "Новая"}\n')
+            file.write('{"model": "post", "id": 100, "text": "Текст"}\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertFalse(Group.objects.filter(slug='new').exists())
+
+    def test_invalid_reference_names_its_batch(self):
+        path = f'{self.directory.name}/ghost.ndjson'
+        records = [
+            {'model': 'post', 'id': 100, 'text': 'Текст', 'author': 'ghost'},
+            {'model': 'post', 'id': 101, 'text': 'Текст', 'author': 'ghost'},
+            {'model': 'follow', 'user': 'writer', 'author': 'writer'},
+        ]
+        for lines, where in ((records, 'Строки 1-2: Нет user'),
+                             (records[:1], 'Строка 1: Нет user')):
+            with self.subTest(where=where):
+                with open(path, 'w', encoding='utf-8') as file:
+                    file.writelines(json.dumps(line) + '\n' for line in lines)
+                with self.assertRaisesMessage(CommandError, where):
+                    call_command('import_posts', path, stdout=StringIO())
+
+    def test_comment_to_missing_post_is_rejected(self):
+        path = f'{self.directory.name}/orphan.ndjson'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({
+                'model': 'comment', 'id': 100, 'post': 999,
+                'author': 'writer', 'text': 'Ответ'}) + '\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 1: Нет post'):
+            call_command('import_posts', path, stdout=StringIO())
@@ -1,14 +1,35 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from core.utils import POSTS_QUANTITY
+from core.cache import bump, known
+from core.queries import QueryBudgetTestMixin
+from core.utils import COMMENTS_QUANTITY, POSTS_QUANTITY
 
-from ..models import Follow, Group, Post
+from .. import caching, thumbnails, variants
+from ..models import Comment, FeedEntry, Follow, Group, Post
 
 POSTS_OVERALL = 13
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
 User = get_user_model()
 
 
@@ -118,6 +139,19 @@ class PostPagesTests(TestCase):
                 form_field = response.context.get('form').fields.get(value)
                 self.assertIsInstance(form_field, expected)
 
+    def test_missing_pages_leave_no_cache_tags(self):
+        cache.clear()
+        cases = (
+            ('posts:group_list', 'missing', caching.group_tags('missing')),
+            ('posts:profile', 'missing', caching.profile_tags('missing')),
+            ('posts:post_detail', 999, caching.post_detail_tags(999)),
+        )
+        for name, arg, tags in cases:
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name, args=[arg]))
+                self.assertEqual(response.status_code, 404)
+                self.assertFalse(known(tags))
+
     def test_post_added_correctly(self):
         cache.clear()
         response_index = self.authorized_client.get(
@@ -196,20 +230,474 @@ class TestPaginator(TestCase):
             )
 
     def test_cache_index(self):
+        url = reverse('posts:index') + '?page=2'
         post = Post.objects.create(
             text='Текст',
             author=self.user)
-        response1 = self.authorized_client.get(
-            reverse('posts:index')).content
-        post.delete()
-        response2 = self.authorized_client.get(
-            reverse('posts:index')).content
+        response1 = self.authorized_client.get(url).content
+        Post.objects.filter(pk=post.pk).update(text='Без сигналов')
+        response2 = self.authorized_client.get(url).content
         self.assertEqual(response1, response2)
-        cache.clear()
-        response3 = self.authorized_client.get(
-            reverse('posts:index')).content
+        post.delete()
+        response3 = self.authorized_client.get(url).content
         self.assertNotEqual(response2, response3)
 
+    def test_group_page_invalidated_by_new_post(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        url += '?page=2'
+        self.authorized_client.get(url)
+        Post.objects.create(text='Свежий пост', author=self.user,
+                            group=self.group)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_unchanged_page_is_not_modified(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        etag = self.authorized_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        Post.objects.create(text='Свежий пост', author=self.user,
+                            group=self.group)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+
+class PrivateConditionalTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='relogin', password='secret-pass')
+        cls.post = Post.objects.create(text='Пост с формой', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        self.client.post(reverse('users:login'), {
+            'username': 'relogin', 'password': 'secret-pass'})
+
+    def test_relogin_does_not_reuse_page_with_old_csrf_token(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.login()
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        token = self.client.cookies['csrftoken'].value
+        self.client.post(reverse('users:logout'))
+        self.login()
+        self.assertNotEqual(self.client.cookies['csrftoken'].value, token)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_page_keeps_its_own_etag(self):
+        url = reverse('posts:profile', args=[self.user.username])
+        etag = self.client.get(url)['ETag']
+        bump(caching.author_tag(self.user.username))
+        add = cache.add
+
+        def locked(key, *args, **kwargs):
+            # Страницу в это время пересчитывает другой воркер.
+            if key.endswith('.lock'):
+                return False
+            return add(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'add', side_effect=locked):
+            stale = self.client.get(url)
+            self.assertEqual(stale['ETag'], etag)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], etag)
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_NONE_MATCH=fresh['ETag']).status_code, 304)
+
+
+class PostCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='card-author')
+        self.group = Group.objects.create(
+            title='Группа', slug='card-group', description='Описание')
+        self.post = Post.objects.create(
+            text='Карточка', author=self.user, group=self.group)
+
+    def test_card_is_rendered_once_for_all_feeds(self):
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(response, 'Карточка')
+        self.post.text = 'Исправленная карточка'
+        self.post.save()
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user}))
+        self.assertContains(response, 'Исправленная карточка')
+
+    def test_card_shows_renamed_author(self):
+        self.client.get(reverse('posts:group_list', args=[self.group.slug]))
+        self.user.first_name, self.user.last_name = 'Новое', 'Имя'
+        self.user.save()
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug]))
+        self.assertContains(response, 'Новое Имя')
+
+    @mock.patch.object(thumbnails, 'enqueue')
+    def test_cached_cards_skip_thumbnail_prefetch(self, enqueue):
+        Post.objects.filter(pk=self.post.pk).update(image='posts/card.gif')
+        url = reverse('posts:index')
+        self.client.get(url)
+        with mock.patch.object(thumbnails, 'ready_thumbnails',
+                               return_value={}) as ready_thumbnails:
+            bump(caching.INDEX)
+            self.client.get(url)
+            ready_thumbnails.assert_not_called()
+            bump(caching.INDEX, caching.post_tag(self.post.pk))
+            self.client.get(url)
+            ready_thumbnails.assert_called_once()
+
+
+class TestCursorPaginator(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cursor')
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Текст {i}')
+            for i in range(POSTS_OVERALL)
+        )
+        self.url = reverse('posts:profile', kwargs={'username': self.user})
+
+    def test_cursor_pages_follow_each_other(self):
+        first = self.client.get(self.url).context['page_obj']
+        response = self.client.get(
+            self.url, {'cursor': first.next_cursor})
+        second = response.context['page_obj']
+        self.assertEqual(len(second), POSTS_OVERALL - POSTS_QUANTITY)
+        self.assertFalse(second.has_next())
+        self.assertNotIn(first[-1], second)
+        response = self.client.get(
+            self.url, {'cursor': second.previous_cursor})
+        self.assertEqual(
+            list(response.context['page_obj']), list(first))
+
+    def test_last_cursor(self):
+        first = self.client.get(self.url).context['page_obj']
+        response = self.client.get(
+            self.url, {'cursor': first.paginator.last_cursor})
+        last = response.context['page_obj']
+        self.assertEqual(len(last), POSTS_QUANTITY)
+        self.assertFalse(last.has_next())
+        self.assertTrue(last.has_previous())
+        self.assertEqual(last[-1], Post.objects.latest('pub_date', 'pk'))
+
+    def test_first_cursor(self):
+        first = self.client.get(self.url).context['page_obj']
+        response = self.client.get(
+            self.url, {'cursor': first.next_cursor})
+        cursor = first.paginator.first_cursor
+        self.assertContains(response, f'?cursor={cursor}')
+        response = self.client.get(self.url, {'cursor': cursor})
+        page = response.context['page_obj']
+        self.assertEqual(list(page), list(first))
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_no_offset_links_to_every_page(self):
+        response = self.client.get(self.url)
+        self.assertNotContains(response, '?page=')
+        self.assertContains(response, '?cursor=')
+
+    def test_cursor_past_the_end(self):
+        first = self.client.get(self.url).context['page_obj']
+        Post.objects.exclude(pk__in=[post.pk for post in first]).delete()
+        response = self.client.get(self.url, {'cursor': first.next_cursor})
+        page = response.context['page_obj']
+        self.assertEqual(list(page), [])
+        self.assertEqual(page.previous_cursor, page.paginator.last_cursor)
+        self.assertNotContains(response, 'cursor=None')
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(self.url, {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+
+class PostDetailQueriesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('detail')
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост',
+            group=Group.objects.create(title='Группа', slug='detail'),
+        )
+        self.url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+
+    def add_comments(self, quantity):
+        start = self.post.comments.count()
+        for i in range(start, start + quantity):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.create_user(f'commentator{i}'),
+                text=f'Комментарий {i}',
+            )
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        return len(context)
+
+    def test_queries_do_not_depend_on_comments(self):
+        self.add_comments(1)
+        # Первый запрос заводит счётчик постов автора.
+        self.count_queries()
+        few = self.count_queries()
+        self.add_comments(COMMENTS_QUANTITY)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_comments_are_paginated(self):
+        self.add_comments(COMMENTS_QUANTITY + 1)
+        response = self.client.get(self.url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_QUANTITY)
+        response = self.client.get(
+            self.url, {'cursor': comments.next_cursor})
+        self.assertEqual(len(response.context['comments']), 1)
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Читатель')
+        cls.author = User.objects.create(username='Пишущий')
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget-slug', description='Описание')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        for i in range(POSTS_QUANTITY + 2):
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group)
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Ответ {i}')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_views_stay_within_budget(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for client in (self.client, self.authorized_client):
+            for url in urls[:-1] if client is self.client else urls:
+                with self.subTest(url=url, user=client is self.client):
+                    cache.clear()
+                    self.assertWithinQueryBudget(client.get(url))
+
+
+class SearchTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Искатель')
+        self.post = Post.objects.create(
+            text='Тёплые вечера в Москве', author=self.user)
+        self.other = Post.objects.create(text='Про котов', author=self.user)
+        Comment.objects.create(
+            post=self.other, author=self.user, text='Москва слезам не верит')
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_posts_found_by_text_and_comments(self):
+        self.assertEqual(self.search('москв'), [self.post, self.other])
+        self.assertEqual(self.search('вечера'), [self.post])
+        self.assertEqual(self.search('"собаки" OR'), [])
+
+    def test_index_follows_changes(self):
+        self.post.text = 'Холодные утра'
+        self.post.save()
+        self.assertEqual(self.search('москв'), [self.other])
+        self.other.delete()
+        self.assertEqual(self.search('москв'), [])
+        self.assertEqual(self.search('утра'), [self.post])
+
+    def test_results_are_paginated(self):
+        for i in range(POSTS_QUANTITY):
+            Post.objects.create(text=f'Москва {i}', author=self.user)
+        self.assertEqual(len(self.search('москва')), POSTS_QUANTITY)
+        self.assertEqual(self.search('москва', page=2), [self.other])
+
+    @mock.patch.object(thumbnails, 'enqueue')
+    def test_results_with_images_stay_within_budget(self, enqueue):
+        for i in range(6):
+            Post.objects.create(
+                text=f'Москва на фото {i}', author=self.user,
+                image=f'posts/moscow{i}.gif')
+        response = self.client.get(reverse('posts:search'), {'q': 'москва'})
+        self.assertTemplateUsed(response, 'includes/post_card.html')
+        self.assertWithinQueryBudget(response)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'вечер'})
+        queryset = response.context['cl'].queryset
+        self.assertEqual(list(queryset), [self.post])
+        self.assertIn('MATCH', str(queryset.query))
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'слезам'})
+        self.assertEqual(
+            list(response.context['cl'].queryset),
+            list(Comment.objects.all()))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='Фотограф')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+        thumbnails._failed.clear()
+
+    def create_post(self):
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'С картинкой',
+            'image': SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        })
+        return Post.objects.get(text='С картинкой')
+
+    def test_upload_enqueues_thumbnail(self):
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            post = self.create_post()
+        enqueue.assert_called_once_with(post)
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_rolled_back_post_leaves_no_pending_job(self):
+        with mock.patch.object(thumbnails, '_get_executor') as executor:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.create_post()
+                    raise RuntimeError
+            self.assertEqual(thumbnails._pending, set())
+            executor.assert_not_called()
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_posts_sharing_an_image_get_own_jobs(self):
+        posts = [
+            Post.objects.create(
+                text=f'Копия {i}', author=self.user, image='posts/same.gif')
+            for i in range(2)
+        ]
+        with mock.patch.object(thumbnails, '_get_executor') as executor:
+            for post in posts:
+                thumbnails._submit(post)
+        submitted = [
+            call.args[1] for call in executor.return_value.submit.mock_calls]
+        self.assertEqual(submitted, posts)
+        thumbnails._pending.clear()
+
+    def test_failed_job_is_not_retried_on_every_render(self):
+        with mock.patch.object(thumbnails, 'get_thumbnail',
+                               side_effect=OSError) as get_thumbnail:
+            with self.assertLogs(thumbnails.logger, 'ERROR'):
+                post = self.create_post()
+            thumbnails.enqueue(post)
+        get_thumbnail.assert_called_once()
+        with mock.patch.object(thumbnails, 'RETRY_AFTER', 0):
+            thumbnails.enqueue(post)
+        self.assertIsNotNone(thumbnails.ready_thumbnail(post.image))
+
+    def test_only_new_image_is_enqueued(self):
+        post = self.create_post()
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            post.text = 'Новая подпись'
+            post.save()
+            enqueue.assert_not_called()
+            post.image = 'posts/other.gif'
+            post.save()
+        enqueue.assert_called_once_with(post)
+
+    def test_page_shows_ready_thumbnail(self):
+        post = self.create_post()
+        thumbnail = thumbnails.ready_thumbnail(post.image)
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_upload_creates_responsive_variants(self):
+        post = self.create_post()
+        formats = variants.supported_formats()
+        self.assertIn('JPEG', formats)
+        self.assertEqual(
+            [variant.width for variant in post.image_variants.all()],
+            [width for width in (320, 640, 960) for _ in formats],
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        smallest = post.image_variants.filter(
+            content_type='image/jpeg').first()
+        self.assertContains(response, 'type="image/jpeg"')
+        self.assertContains(response, f'{smallest.image.url} 320w')
+
+    def test_placeholder_while_thumbnail_is_pending(self):
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            post = self.create_post()
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, 'Изображение обрабатывается')
+        enqueue.assert_called_with(post)
+
+    def test_page_thumbnails_are_fetched_in_one_query(self):
+        posts = [
+            Post.objects.create(
+                text=f'Картинка {i}', author=self.user,
+                image=SimpleUploadedFile(
+                    f'small{i}.gif', SMALL_GIF, content_type='image/gif'),
+            )
+            for i in range(3)
+        ]
+        for post in posts:
+            thumbnails.generate(post)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        for post in posts:
+            self.assertContains(
+                response, thumbnails.ready_thumbnail(post.image).url)
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -262,3 +750,20 @@ class FollowTest(TestCase):
             reverse('posts:profile_unfollow',
                     kwargs={'username': self.authorr}))
         self.assertEqual(Follow.objects.count(), count - 1)
+
+    def test_follow_feed_is_materialized(self):
+        Follow.objects.create(user=self.subscriberr, author=self.authorr)
+        new_post = Post.objects.create(text='Новый', author=self.authorr)
+        self.assertEqual(
+            set(self.subscriberr.feed.values_list('post', flat=True)),
+            {self.post.pk, new_post.pk}
+        )
+        Follow.objects.filter(user=self.subscriberr).delete()
+        self.assertFalse(self.subscriberr.feed.exists())
+
+    def test_backfill_feed_command(self):
+        Follow.objects.create(user=self.subscriberr, author=self.authorr)
+        FeedEntry.objects.all().delete()
+        call_command('backfill_feed', stdout=StringIO())
+        response = self.follower.get(reverse('posts:follow_index'))
+        self.assertIn(self.post, response.context['page_obj'])
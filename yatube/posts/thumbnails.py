@@ -0,0 +1,196 @@
+"""Фоновая обработка картинок постов: миниатюра и варианты для srcset.
+
+Раньше миниатюру строил `{% thumbnail %}` при первом показе страницы,
+и первый посетитель ждал, пока Pillow уменьшит каждую новую картинку.
+Теперь сохранение поста с новой картинкой ставит задачу в пул потоков
+после коммита, а шаблоны только читают готовые миниатюры из хранилища
+sorl; пока задача не выполнена, вместо картинки показывается заглушка.
+Упавшая задача (например, пропал исходный файл) повторяется не раньше
+чем через RETRY_AFTER секунд, а не при каждом показе страницы. Там же строятся
+варианты картинки разной ширины (см. `posts.variants`). Готовая обработка
+сбрасывает кэш страниц поста, и заглушка сменяется картинкой.
+
+При `THUMBNAIL_WORKERS = 0` миниатюры строятся сразу, без пула (тесты).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import caching, variants
+
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+RETRY_AFTER = 10 * 60
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+# Задачи (пост, картинка) в очереди этого процесса. Ключ - пост, а не
+# только имя файла: одинаковые картинки разных постов делят файл, но
+# строки вариантов у каждого поста свои.
+_pending = set()
+# Время последней неудачи задачи.
+_failed = {}
+_pending_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def _thumbnail_options(source):
+    # Те же опции, что добавляет к запросу ThumbnailBackend.get_thumbnail,
+    # иначе имя файла миниатюры не совпадёт.
+    backend = default.backend
+    options = dict(OPTIONS)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _thumbnail_file(image):
+    source = ImageFile(image)
+    name = default.backend._get_thumbnail_filename(
+        source, GEOMETRY, _thumbnail_options(source)
+    )
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(image):
+    """Готовая миниатюра картинки или None, если её ещё нет."""
+    return default.kvstore.get(_thumbnail_file(image))
+
+
+def ready_thumbnails(images):
+    """Готовые миниатюры нескольких картинок: имя картинки -> миниатюра.
+
+    Для хранилища sorl по умолчанию все записи читаются одним `get_many`
+    из кэша, а недостающие - одним запросом к базе.
+    """
+    thumbnails = {
+        image.name: _thumbnail_file(image) for image in images if image
+    }
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return {
+            name: kvstore.get(thumbnail)
+            for name, thumbnail in thumbnails.items()
+        }
+    names = {
+        add_prefix(thumbnail.key): name
+        for name, thumbnail in thumbnails.items()
+    }
+    values = kvstore.cache.get_many(list(names))
+    missing = [key for key in names if key not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        fetched = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        # Как и KVStore, запоминаем в кэше и отсутствие записи.
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        name: (
+            None if values[key] == EMPTY_VALUE
+            else deserialize_image_file(values[key])
+        )
+        for key, name in names.items()
+    }
+
+
+def _job(post):
+    return post.pk, post.image.name
+
+
+def _claim(job):
+    """Берёт задачу, если её нет в очереди и она недавно не падала."""
+    with _pending_lock:
+        failed = _failed.get(job)
+        if failed is not None:
+            if time.monotonic() - failed < RETRY_AFTER:
+                return False
+            del _failed[job]
+        if job in _pending:
+            return False
+        _pending.add(job)
+        return True
+
+
+def generate(post):
+    """Строит миниатюру и варианты картинки, сбрасывает кэш страниц."""
+    job = _job(post)
+    try:
+        get_thumbnail(post.image, GEOMETRY, **OPTIONS)
+        variants.create(post)
+        caching.invalidate_post(post)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру %s', post.image)
+        with _pending_lock:
+            _failed[job] = time.monotonic()
+    finally:
+        with _pending_lock:
+            _pending.discard(job)
+
+
+def _run_in_worker(post):
+    try:
+        generate(post)
+    finally:
+        connection.close()
+
+
+def _submit(post):
+    if _claim(_job(post)):
+        _get_executor().submit(_run_in_worker, post)
+
+
+def enqueue(post):
+    """Ставит миниатюру картинки поста в очередь, если её там нет.
+
+    Задача занимает место в очереди только после коммита: при откате
+    транзакции от неё ничего не остаётся.
+    """
+    if not post.image:
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        if _claim(_job(post)):
+            generate(post)
+        return
+    transaction.on_commit(lambda: _submit(post))
+
+
+def drain():
+    """Дожидается всех задач очереди; следующая задача запустит новый пул."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
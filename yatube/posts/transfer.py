@@ -0,0 +1,295 @@
+"""Выгрузка и загрузка контента в NDJSON: одна JSON-запись на строку.
+
+Выгрузка читает таблицы через `.iterator()` кусками, загрузка
+вставляет записи пачками `bulk_create`, поэтому память не зависит от
+объёма. Порядок записей - группы, пользователи, посты, комментарии,
+подписки: к каждой записи всё, на что она ссылается, уже загружено.
+
+Посты и комментарии сохраняют свои ключи, чтобы адреса страниц
+остались прежними. Пользователи и группы сопоставляются по `username`
+и `slug` и заводятся, только если их ещё нет; пароли не выгружаются,
+новые пользователи получают непригодный пароль и восстанавливают его
+через сброс. Файлы картинок не переносятся - только их имена.
+"""
+import json
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump
+
+from . import caching, derived
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 2000
+
+GROUP_FIELDS = ('slug', 'title', 'description')
+USER_FIELDS = ('username', 'first_name', 'last_name', 'email')
+POST_FIELDS = (
+    'pk', 'text', 'pub_date', 'author__username', 'group__slug', 'image')
+COMMENT_FIELDS = ('pk', 'post_id', 'author__username', 'text', 'created')
+FOLLOW_FIELDS = ('user__username', 'author__username')
+REQUIRED = {
+    'group': ('slug', 'title'),
+    'user': ('username',),
+    'post': ('id', 'text', 'author'),
+    'comment': ('id', 'post', 'author', 'text'),
+    'follow': ('user', 'author'),
+}
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def _rows(queryset, fields, batch_size):
+    return queryset.order_by('pk').values(*fields).iterator(
+        chunk_size=batch_size)
+
+
+def records(batch_size=BATCH_SIZE):
+    """Записи выгрузки по порядку, без накопления в памяти."""
+    for row in _rows(Group.objects, GROUP_FIELDS, batch_size):
+        yield {'model': 'group', **row}
+    for row in _rows(User.objects, USER_FIELDS, batch_size):
+        yield {'model': 'user', **row}
+    for row in _rows(Post.objects, POST_FIELDS, batch_size):
+        yield {
+            'model': 'post', 'id': row['pk'], 'text': row['text'],
+            'pub_date': row['pub_date'], 'author': row['author__username'],
+            'group': row['group__slug'], 'image': row['image'],
+        }
+    for row in _rows(Comment.objects, COMMENT_FIELDS, batch_size):
+        yield {
+            'model': 'comment', 'id': row['pk'], 'post': row['post_id'],
+            'author': row['author__username'], 'text': row['text'],
+            'created': row['created'],
+        }
+    for row in _rows(Follow.objects, FOLLOW_FIELDS, batch_size):
+        yield {
+            'model': 'follow', 'user': row['user__username'],
+            'author': row['author__username'],
+        }
+
+
+def _default(value):
+    # DjangoJSONEncoder отбрасывает микросекунды, а даты должны
+    # вернуться при загрузке в точности.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def export(file, batch_size=BATCH_SIZE):
+    """Пишет записи в текстовый файл; возвращает число записей по видам."""
+    counts = {}
+    for record in records(batch_size):
+        file.write(json.dumps(
+            record, default=_default, ensure_ascii=False) + '\n')
+        counts[record['model']] = counts.get(record['model'], 0) + 1
+    return counts
+
+
+def _date(value):
+    if not value:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise InvalidRecord(f'Не дата: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+def _create_keeping_dates(model, field, objects):
+    """`bulk_create`, после которого даты из выгрузки возвращаются.
+
+    `auto_now_add` подставляет при вставке текущее время, а выключать его
+    на поле модели нельзя: это задело бы сохранения в других потоках.
+    Поэтому даты восстанавливаются одним `bulk_update` на пачку.
+    """
+    objects = list(objects)
+    dates = [getattr(obj, field) for obj in objects]
+    model.objects.bulk_create(objects)
+    for obj, date in zip(objects, dates):
+        setattr(obj, field, date)
+    model.objects.bulk_update(objects, [field])
+
+
+def _resolve(model, field, values):
+    values = set(values) - {None}
+    found = dict(model.objects.filter(
+        **{f'{field}__in': values}).values_list(field, 'pk'))
+    missing = values - found.keys()
+    if missing:
+        raise InvalidRecord(
+            f'Нет {model._meta.model_name} {field}='
+            f'{", ".join(map(str, sorted(missing)))}'
+        )
+    return found
+
+
+class Importer:
+    """Копит записи одного вида и вставляет их пачками.
+
+    Теги кэша авторов, групп, подписчиков и частей карты сайта
+    собираются и сбрасываются после загрузки: посты и комментарии
+    приходят с новыми ключами, поэтому их собственных страниц в кэше
+    ещё нет.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress or (lambda kind, done, total: None)
+        self.model = None
+        self.pending = []
+        self.lines = None
+        self.counts = {}
+        self.tags = {caching.INDEX}
+
+    def add(self, record, line=None):
+        """Проверяет поля записи; ссылки и даты проверяет `flush`."""
+        try:
+            model = self._check(record)
+        except InvalidRecord as error:
+            raise InvalidRecord(f'Строка {line}: {error}') from None
+        if model != self.model or len(self.pending) >= self.batch_size:
+            self.flush()
+            self.model = model
+            self.lines = (line, line)
+        self.pending.append(record)
+        self.lines = (self.lines[0], line)
+
+    def _check(self, record):
+        if not isinstance(record, dict):
+            raise InvalidRecord('Запись должна быть объектом')
+        model = record.get('model')
+        if model not in REQUIRED:
+            raise InvalidRecord(f'Неизвестный вид записи: {model!r}')
+        missing = [field for field in REQUIRED[model] if field not in record]
+        if missing:
+            raise InvalidRecord(
+                f'В записи {model} нет полей: {", ".join(missing)}')
+        return model
+
+    def _where(self):
+        first, last = self.lines
+        return f'Строка {first}' if first == last else f'Строки {first}-{last}'
+
+    def flush(self):
+        """Вставляет накопленную пачку; ошибка называет её строки."""
+        if not self.pending:
+            return
+        try:
+            getattr(self, f'_insert_{self.model}')(self.pending)
+        except (ValueError, TypeError, IntegrityError) as error:
+            raise InvalidRecord(f'{self._where()}: {error}') from None
+        done = self.counts.get(self.model, 0) + len(self.pending)
+        self.counts[self.model] = done
+        self.progress(self.model, done, None)
+        self.pending = []
+
+    def _insert_group(self, records):
+        Group.objects.bulk_create((
+            Group(slug=record['slug'], title=record['title'],
+                  description=record.get('description', ''))
+            for record in records
+        ), ignore_conflicts=True)
+        groups = _resolve(
+            Group, 'slug', (record['slug'] for record in records))
+        for slug, pk in groups.items():
+            self.tags.add(caching.group_tag(slug))
+            self.tags.add(caching.sitemap_tag('groups', pk))
+
+    def _insert_user(self, records):
+        User.objects.bulk_create((
+            User(username=record['username'],
+                 first_name=record.get('first_name', ''),
+                 last_name=record.get('last_name', ''),
+                 email=record.get('email', ''),
+                 password=make_password(None))
+            for record in records
+        ), ignore_conflicts=True)
+
+    def _insert_post(self, records):
+        authors = _resolve(
+            User, 'username', (record['author'] for record in records))
+        groups = _resolve(
+            Group, 'slug', (record.get('group') for record in records))
+        _create_keeping_dates(Post, 'pub_date', (
+            Post(pk=record['id'], text=record['text'],
+                 pub_date=_date(record.get('pub_date')),
+                 author_id=authors[record['author']],
+                 group_id=groups.get(record.get('group')),
+                 image=record.get('image') or '')
+            for record in records
+        ))
+        for username, pk in authors.items():
+            self.tags.add(caching.author_tag(username))
+            self.tags.add(caching.sitemap_tag('profiles', pk))
+        self.tags.update(
+            caching.sitemap_tag('groups', pk) for pk in groups.values())
+        self.tags.update(
+            caching.sitemap_tag('posts', record['id']) for record in records)
+
+    def _insert_comment(self, records):
+        authors = _resolve(
+            User, 'username', (record['author'] for record in records))
+        _resolve(Post, 'pk', (record['post'] for record in records))
+        _create_keeping_dates(Comment, 'created', (
+            Comment(pk=record['id'], post_id=record['post'],
+                    author_id=authors[record['author']],
+                    text=record['text'],
+                    created=_date(record.get('created')))
+            for record in records
+        ))
+
+    def _insert_follow(self, records):
+        users = _resolve(User, 'username', (
+            username for record in records
+            for username in (record['user'], record['author'])
+        ))
+        Follow.objects.bulk_create((
+            Follow(user_id=users[record['user']],
+                   author_id=users[record['author']])
+            for record in records
+        ), ignore_conflicts=True)
+        for record in records:
+            self.tags.add(caching.author_tag(record['author']))
+            self.tags.add(caching.follower_tag(users[record['user']]))
+
+
+def _reset_sequences():
+    # SQLite сам сдвигает AUTOINCREMENT за явный ключ, PostgreSQL - нет.
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [Post, Comment])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def load(lines, batch_size=BATCH_SIZE, progress=None):
+    """Загружает записи из строк NDJSON одной транзакцией.
+
+    Возвращает число записей по видам и записей лент подписок.
+    Ошибка в любой строке откатывает всю загрузку.
+    """
+    importer = Importer(batch_size, progress)
+    with transaction.atomic():
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise InvalidRecord(f'Строка {number}: {error}') from None
+            importer.add(record, number)
+        importer.flush()
+        _reset_sequences()
+        feed = derived.rebuild(importer.progress)
+    bump(*importer.tags)
+    return {**importer.counts, 'feed': feed}
@@ -0,0 +1,110 @@
+"""Варианты картинки поста разной ширины и в современных форматах.
+
+Картинка в ленте показывается кадром 960x339, а мобильным клиентам
+достаточно более узкого. Для каждой ширины из `WIDTHS` создаётся кадр
+того же соотношения сторон в каждом формате из `FORMATS`, который умеет
+сохранять установленный Pillow (AVIF и WebP есть не во всех сборках,
+JPEG есть всегда). Шаблоны выводят их через `srcset`, и браузер выбирает
+подходящий файл сам.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import ImageVariant
+
+WIDTHS = (320, 640, 960, 1280)
+# Ширина кадра в шаблонах: до неё картинка увеличивается, как и миниатюра.
+BASE_WIDTH = 960
+ASPECT_RATIO = 339 / 960
+# Формат Pillow: (тип содержимого, расширение), в порядке предпочтения.
+FORMATS = {
+    'AVIF': ('image/avif', 'avif'),
+    'WEBP': ('image/webp', 'webp'),
+    'JPEG': ('image/jpeg', 'jpg'),
+}
+QUALITY = 80
+
+
+def supported_formats():
+    Image.init()
+    return [name for name in FORMATS if name in Image.SAVE]
+
+
+def _widths(original_width):
+    limit = max(original_width, BASE_WIDTH)
+    return [width for width in WIDTHS if width <= limit]
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=QUALITY)
+    return buffer.getvalue()
+
+
+def create(post):
+    """Пересоздаёт варианты картинки поста; старые файлы удаляются.
+
+    Варианты той же картинки другого поста не строятся заново, а
+    используются совместно.
+    """
+    for variant in post.image_variants.all():
+        variant.delete()
+    if not post.image:
+        return []
+    shared = {
+        variant.image.name: variant
+        for variant in ImageVariant.objects.filter(
+            post__image=post.image.name
+        ).exclude(post=post)
+    }
+    if shared:
+        # Та же картинка уже есть у другого поста: её варианты готовы.
+        return ImageVariant.objects.bulk_create(
+            ImageVariant(
+                post=post, image=name, width=variant.width,
+                content_type=variant.content_type,
+            )
+            for name, variant in shared.items()
+        )
+    with post.image.open('rb') as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    variants = []
+    for width in _widths(original.width):
+        frame = ImageOps.fit(
+            original, (width, round(width * ASPECT_RATIO)), Image.LANCZOS
+        )
+        for image_format in supported_formats():
+            content_type, extension = FORMATS[image_format]
+            variant = ImageVariant(
+                post=post, width=width, content_type=content_type
+            )
+            variant.image.save(
+                f'{stem}.{width}w.{extension}',
+                ContentFile(_encode(frame, image_format)),
+                save=False,
+            )
+            variant.save()
+            variants.append(variant)
+    return variants
+
+
+def srcsets(variants):
+    """Пары (тип, srcset) для тегов `<source>` в порядке предпочтения."""
+    grouped = {}
+    for variant in sorted(variants, key=lambda variant: variant.width):
+        grouped.setdefault(variant.content_type, []).append(
+            f'{variant.image.url} {variant.width}w'
+        )
+    return [
+        (content_type, ', '.join(grouped[content_type]))
+        for content_type, _ in FORMATS.values() if content_type in grouped
+    ]
@@ -1,57 +1,93 @@
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_safe
 
-from core.utils import paginatorr
+from core.cache import (
+    PAGE_TIMEOUT, cache_page_versioned, condition_versioned,
+)
+from core.queries import query_budget
+from core.utils import COMMENTS_QUANTITY, POSTS_QUANTITY, paginatorr
 
+from . import caching, counters, search, syndication
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
 
 
-@cache_page(20, key_prefix='index_page')
+@condition_versioned(lambda request: caching.index_tags(), private=True)
+@cache_page_versioned(PAGE_TIMEOUT, 'index_page', caching.index_tags)
+@query_budget(8)
 def index(request):
     context = {
         'page_obj': paginatorr(
-            Post.objects.select_related('group', 'author'), request),
+            Post.objects.select_related('group', 'author')
+            .prefetch_related('image_variants'), request,
+            count=counters.total()),
         'index': True
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition_versioned(
+    lambda request, slug: caching.group_tags(slug), private=True,
+    exists=caching.group_exists)
+@cache_page_versioned(PAGE_TIMEOUT, 'group_page', caching.group_tags)
+@query_budget(8)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
+    posts = group.posts.select_related('author').prefetch_related(
+        'image_variants')
     context = {
         'groups': group,
-        'page_obj': paginatorr(posts, request)
+        'page_obj': paginatorr(
+            posts, request, count=counters.for_group(group.pk))
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@condition_versioned(
+    lambda request, username: caching.profile_tags(username),
+    private=True, exists=caching.author_exists)
+@cache_page_versioned(PAGE_TIMEOUT, 'profile_page', caching.profile_tags)
+@query_budget(10)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    count = author.posts.count()
+    count = counters.for_author(author.pk)
     following = (request.user.is_authenticated
                  and request.user.follower.filter(author=author).exists())
-    posts = author.posts.all()
+    posts = author.posts.select_related('author', 'group').prefetch_related(
+        'image_variants')
     context = {
         'count': count,
         'author': author,
-        'page_obj': paginatorr(posts, request),
+        'page_obj': paginatorr(posts, request, count=count),
         'following': following
     }
     template = 'posts/profile.html'
     return render(request, template, context)
 
 
+@condition_versioned(
+    lambda request, post_id: caching.post_detail_tags(post_id),
+    private=True, exists=caching.post_exists)
+@cache_page_versioned(
+    PAGE_TIMEOUT, 'post_page', caching.post_detail_tags)
+@query_budget(12)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
     author = post.author
     form = CommentForm()
-    comments = post.comments.all()
+    comments = paginatorr(
+        post.comments.select_related('author').order_by('created', 'pk'),
+        request,
+        per_page=COMMENTS_QUANTITY,
+        ordering=('created', 'pk'),
+    )
     context = {
         'post': post,
         'author': author,
+        'count': counters.for_author(post.author_id),
         'form': form,
         'comments': comments
     }
@@ -69,6 +105,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            form.save_m2m()
             return redirect('posts:profile', post.author)
     return render(
         request,
@@ -88,7 +125,7 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        post.save()
+        form.save()
         return redirect('posts:post_detail', post_id)
     return render(
         request,
@@ -110,10 +147,14 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(6)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    entries = request.user.feed.select_related(
+        'post__author', 'post__group').prefetch_related('post__image_variants')
+    page_obj = paginatorr(entries, request)
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {
-        'page_obj': paginatorr(posts, request),
+        'page_obj': page_obj,
         'follow': True
     }
     return render(request, 'posts/follow.html', context)
@@ -140,3 +181,62 @@ def profile_unfollow(request, username):
     return redirect(
         'posts:profile', username=username
     )
+
+
+@query_budget(6)
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = Paginator(
+        search.SearchResults(query), POSTS_QUANTITY
+    ).get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@require_safe
+@condition_versioned(
+    lambda request, slug: caching.group_tags(slug),
+    exists=caching.group_exists)
+@query_budget(3)
+def group_feed(request, slug):
+    return syndication.shard_response(
+        request, caching.group_tags(slug),
+        lambda: syndication.group_feed(request, slug), syndication.ATOM,
+    )
+
+
+@require_safe
+@condition_versioned(
+    lambda request, username: caching.profile_tags(username),
+    exists=caching.author_exists)
+@query_budget(3)
+def profile_feed(request, username):
+    return syndication.shard_response(
+        request, caching.profile_tags(username),
+        lambda: syndication.profile_feed(request, username),
+        syndication.ATOM,
+    )
+
+
+@require_safe
+@query_budget(3)
+def sitemap_index(request):
+    return syndication.stream_response(
+        request, syndication.sitemap_index(request), syndication.XML)
+
+
+@require_safe
+@condition_versioned(
+    lambda request, section, number: syndication.sitemap_tags(
+        section, number),
+    exists=syndication.shard_exists)
+@query_budget(1)
+def sitemap(request, section, number):
+    return syndication.shard_response(
+        request, syndication.sitemap_tags(section, number),
+        lambda: syndication.sitemap(request, section, number),
+        syndication.XML,
+    )
@@ -0,0 +1,23 @@
+"""Настройки по профилям: dev, test и prod.
+
+Профиль выбирает переменная окружения YATUBE_ENV (по умолчанию dev,
+а под `manage.py test` и pytest - test, как бы они ни были запущены).
+Модуль профиля можно указать и прямо: DJANGO_SETTINGS_MODULE=
+yatube.settings.prod.
+"""
+import os
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
+
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+PROFILE = os.environ.get('YATUBE_ENV', 'test' if TESTING else 'dev')
+
+if PROFILE == 'dev':
+    from .dev import *  # noqa: F401,F403
+elif PROFILE == 'test':
+    from .test import *  # noqa: F401,F403
+elif PROFILE == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f'Неизвестный профиль YATUBE_ENV={PROFILE}')
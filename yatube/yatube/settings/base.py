@@ -1,10 +1,15 @@
+"""Общие настройки всех профилей."""
 import os
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
 
-SECRET_KEY = '1#&@eu2sec@*3s0vmcy)z)8x0hxo$3%x3sdz053bdr_j62+0$2'
+SECRET_KEY = os.environ.get(
+    'YATUBE_SECRET_KEY', '1#&@eu2sec@*3s0vmcy)z)8x0hxo$3%x3sdz053bdr_j62+0$2'
+)
 
-DEBUG = True
+DEBUG = False
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -13,9 +18,19 @@ ALLOWED_HOSTS = [
     'testserver',
 ]
 
+# Один файл кэша на хост: его делят все воркеры.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache.sqlite3'),
+        ),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
     }
 }
 
@@ -24,6 +39,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -34,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,12 +61,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# True - превышение бюджета запросов view ошибка, а не запись в лог.
+QUERY_BUDGET_STRICT = False
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -68,10 +89,29 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get(
+            'YATUBE_DB_PATH', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        # Сколько секунд ждать, пока другой воркер держит запись.
+        'OPTIONS': {'timeout': 20},
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 0)),
     }
 }
 
+# PRAGMA для каждого нового соединения с SQLite (core.db). WAL позволяет
+# читать во время записи, а synchronous=NORMAL в режиме WAL не теряет
+# согласованность базы и не ждёт fsync на каждой транзакции.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,
+    'mmap_size': 128 * 2 ** 20,
+}
+
+# Сессия читается из кэша, а в базу пишется только при изменении.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -111,5 +151,14 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки проверяются и пишутся на диск по мере поступления.
+FILE_UPLOAD_HANDLERS = ['core.uploads.ImageUploadHandler']
+UPLOAD_IMAGE_MAX_SIZE = 10 * 2 ** 20
+UPLOAD_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+
+# Потоки, в которых строятся миниатюры картинок; 0 - строить сразу.
+THUMBNAIL_WORKERS = 2
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
@@ -0,0 +1,4 @@
+"""Разработка: отладка включена, шаблоны перечитываются с диска."""
+from .base import *  # noqa: F401,F403
+
+DEBUG = True
@@ -0,0 +1,40 @@
+"""Боевой сервер: ключ, имена хоста и база берутся из окружения."""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, MIDDLEWARE, TEMPLATES
+
+SECRET_KEY = os.environ['YATUBE_SECRET_KEY']
+
+ALLOWED_HOSTS = os.environ.get('YATUBE_ALLOWED_HOSTS', 'localhost').split(',')
+
+# Соединение с базой переживает запрос и не открывается заново.
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 600)),
+    }
+}
+
+# Шаблоны читаются с диска и разбираются один раз на процесс,
+# а не при каждом запросе.
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+# collectstatic добавляет к именам хэш и кладёт рядом сжатые копии,
+# а раздаёт их сам Django с кэшированием на год.
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
+MIDDLEWARE = ['core.middleware.StaticFilesMiddleware', *MIDDLEWARE]
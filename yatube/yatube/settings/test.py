@@ -0,0 +1,18 @@
+"""Тесты: всё в памяти процесса и без фоновых потоков."""
+from .base import *  # noqa: F401,F403
+
+# Тесты не должны видеть записи прошлых запусков.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Тестовая база живёт в памяти, WAL ей не нужен.
+SQLITE_PRAGMAS = {}
+
+# Миниатюры строятся сразу, в потоке теста.
+THUMBNAIL_WORKERS = 0
+
+# Пароль хэшируется при каждом create_user: быстрый хэш ускоряет тесты.
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']